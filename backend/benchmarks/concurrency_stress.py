@@ -0,0 +1,132 @@
+"""
+Stress test: one shared detector instance serving many videos at once
+
+Runs the same synthetic videos through shared detector instances serially
+and then from a thread pool, and fails if any per-frame result differs.
+Then does the same with whole /process-video requests through the Flask
+test client, so the shared detector cache, result cache and embedding
+store are exercised too. Uses stub models, so it needs no weights or
+network.
+
+Usage (from backend/):
+    python -m benchmarks.concurrency_stress --videos 16 --threads 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from models.resnet_detector import ResNetDetector
+from models.yolo_detector import YOLODetector
+from models.temporal_detector import TemporalDetector
+from models.motion_gated_detector import MotionGatedDetector
+from benchmarks.stubs import (StubDetector, StatefulStubYOLOModel, stub_resnet,
+                              synthetic_video, write_video)
+
+class StubResNetDetector(ResNetDetector):
+    """ResNetDetector on the stub backbone, with frame-dependent class scores"""
+
+    def load(self):
+        return stub_resnet(self, logit_scale=50.0)
+
+class StubYOLODetector(YOLODetector):
+    """YOLODetector on a stub model that breaks if calls overlap"""
+
+    def load(self):
+        self.model = StatefulStubYOLOModel()
+        return self
+
+def run_video(detector, frames):
+    # Embeddings make every ResNet frame result depend on the exact input
+    session = detector.create_session(return_embeddings=True)
+    return [detector.detect(frame, session) for frame in frames]
+
+def same(a, b):
+    """Deep equality that also compares numpy arrays (e.g. embeddings)"""
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return isinstance(b, (list, tuple)) and len(a) == len(b) and all(map(same, a, b))
+    if isinstance(a, np.ndarray):
+        return isinstance(b, np.ndarray) and np.array_equal(a, b)
+    return a == b
+
+def check_detectors(videos, threads):
+    """Shared detector instances, called directly"""
+    detectors = {
+        'stub': StubDetector().load(),
+        'temporal_stub': TemporalDetector(StubDetector(), sequence_length=5).load(),
+        'motion_stub': MotionGatedDetector(StubDetector(), warmup_frames=5).load(),
+        'resnet_stub': StubResNetDetector(confidence_threshold=0.1).load(),
+        'yolo_stub': StubYOLODetector().load(),
+        'temporal_yolo_stub': TemporalDetector(StubYOLODetector(), sequence_length=5).load(),
+    }
+
+    failed = False
+    for name, detector in detectors.items():
+        serial = [run_video(detector, frames) for frames in videos]
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            concurrent = list(pool.map(lambda frames: run_video(detector, frames), videos))
+
+        mismatches = sum(not same(a, b) for s, c in zip(serial, concurrent) for a, b in zip(s, c))
+        print(f"{name:>20}: {mismatches} mismatched frames out of {sum(len(v) for v in videos)}")
+        failed = failed or mismatches > 0
+    return failed
+
+def check_server(videos, threads):
+    """Whole /process-video requests through the Flask test client"""
+    workdir = tempfile.mkdtemp()
+    os.environ['FUZZYFINDER_EMBEDDINGS_DIR'] = os.path.join(workdir, 'embeddings')
+    os.environ['FUZZYFINDER_MODE'] = 'local'
+    import server
+    from models.registry import DETECTORS
+
+    # Served like any registered detector, so requests go through get_detector
+    DETECTORS['resnet_stub'] = lambda: StubResNetDetector(confidence_threshold=0.1)
+    DETECTORS['yolo_stub'] = lambda: StubYOLODetector()
+    DETECTORS['temporal_stub'] = lambda: TemporalDetector(StubDetector(), sequence_length=5)
+
+    paths = [write_video(os.path.join(workdir, f"video_{i}.avi"), frames)
+             for i, frames in enumerate(videos)]
+
+    def request(detector_type, path):
+        with open(path, 'rb') as f:
+            response = server.app.test_client().post('/process-video', data={
+                'video': (f, os.path.basename(path)),
+                'detector': detector_type,
+                'analysis_fps': 'native',
+                'store_embeddings': 'true'
+            }, content_type='multipart/form-data')
+        return response.status_code, response.get_json()
+
+    failed = False
+    for detector_type in ('resnet_stub', 'yolo_stub', 'temporal_stub'):
+        serial = [request(detector_type, path) for path in paths]
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            concurrent = list(pool.map(lambda path: request(detector_type, path), paths))
+
+        errors = sum(status != 200 for status, _ in serial + concurrent)
+        mismatches = sum(a != b for a, b in zip(serial, concurrent))
+        print(f"{'server ' + detector_type:>20}: {mismatches} mismatched responses out of {len(paths)}, "
+              f"{errors} errors")
+        failed = failed or mismatches > 0 or errors > 0
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--videos', type=int, default=16)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    videos = [synthetic_video(seed) for seed in range(args.videos)]
+
+    failed = check_detectors(videos, args.threads)
+    failed = check_server(videos, args.threads) or failed
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
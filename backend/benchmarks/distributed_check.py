@@ -0,0 +1,154 @@
+"""
+Check that sharded processing matches single-process results, including
+when workers fail: one hangs mid-shard, one dies between taking a job and
+leasing it, and one hits a broker error outside the job
+
+Uses the in-process broker and stub detectors, so it needs no Redis,
+weights or network.
+
+Usage (from backend/):
+    python -m benchmarks.distributed_check --workers 3 --shard-seconds 2 [--analysis-fps 7]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from models.temporal_detector import TemporalDetector
+from models.motion_gated_detector import MotionGatedDetector
+from utils.video_processor import extract_frames, find_animal_segments
+from utils.resource_governor import ResourceGovernor, probe_video
+from distributed.broker import InMemoryBroker
+from distributed.coordinator import Coordinator, ShardFailed
+from distributed.sharding import encode_candidates
+from distributed.worker import InferenceWorker, JOB_QUEUE, PROCESSING_QUEUE
+from benchmarks.stubs import StubDetector, synthetic_video, write_video
+
+class HangingWorker(InferenceWorker):
+    """Takes one shard and hangs without making progress"""
+
+    def process_shard(self, job):
+        self._stop.set()
+        threading.Event().wait()
+
+class VanishingWorker(InferenceWorker):
+    """Dies right after taking a job, before it writes the lease"""
+
+    def run_once(self):
+        if self.broker.pop_to(JOB_QUEUE, PROCESSING_QUEUE, timeout=self.poll_timeout) is not None:
+            self._stop.set()
+
+class FlakyBroker:
+    """Proxy whose first result push fails, like a dropped connection"""
+
+    def __init__(self, broker):
+        self._broker = broker
+        self._failed = False
+
+    def push(self, queue_name, message, ttl=None):
+        if queue_name.startswith('fuzzyfinder:results') and not self._failed:
+            self._failed = True
+            raise ConnectionError("simulated broker outage")
+        self._broker.push(queue_name, message, ttl)
+
+    def __getattr__(self, name):
+        return getattr(self._broker, name)
+
+def serial_results(detector, video_path, target_fps=None):
+    """Reference: the whole video through one session in one process"""
+    video_data = extract_frames(video_path, target_fps=target_fps)
+    session = detector.create_session()
+    candidates_seq = [detector.detect_raw(frame, session) for frame in video_data['frames']]
+    frames = detector.postprocess(candidates_seq)
+    for result, frame_number, timestamp in zip(frames, video_data['frame_numbers'], video_data['timestamps']):
+        result['frame_number'] = frame_number
+        result['timestamp'] = timestamp
+    candidates = [encode_candidates(c, n, t) for c, n, t in
+                  zip(candidates_seq, video_data['frame_numbers'], video_data['timestamps'])]
+    return frames, candidates, find_animal_segments(frames, video_data['fps'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--shard-seconds', type=float, default=2.0)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--analysis-fps', type=float, default=None,
+                        help='Sample at this rate (default: every frame)')
+    args = parser.parse_args()
+
+    # Each worker builds its own detectors, as separate processes would,
+    # so the check catches models that differ between instances
+    factories = {
+        'stub': lambda: StubDetector(),
+        'temporal_stub': lambda: TemporalDetector(StubDetector(), sequence_length=5),
+        'motion_stub': lambda: MotionGatedDetector(StubDetector(), warmup_frames=5),
+    }
+    detectors = {name: factory().load() for name, factory in factories.items()}
+
+    video_path = write_video(os.path.join(tempfile.mkdtemp(), 'video.avi'),
+                             synthetic_video(5, num_frames=args.frames))
+    # Containers often under-report frame counts; the last shard must still
+    # read to the end, within the request's frame buffer limit
+    plan = ResourceGovernor(memory_budget=4 * 1024 ** 3).plan(probe_video(video_path), args.analysis_fps)
+    video_info = dict(probe_video(video_path), frame_count=int(args.frames * 0.85))
+
+    broker = InMemoryBroker()
+    workers = [
+        HangingWorker(broker, 'hangs', factories, lease_ttl=0.5),
+        VanishingWorker(broker, 'vanishes', factories, lease_ttl=0.5),
+        InferenceWorker(FlakyBroker(broker), 'flaky', factories, lease_ttl=0.5)
+    ]
+    workers += [InferenceWorker(broker, f"worker-{i}", factories, lease_ttl=0.5)
+                for i in range(args.workers)]
+    coordinator = Coordinator(broker, shard_seconds=args.shard_seconds, warmup_seconds=1.0,
+                              poll_interval=0.05, claim_grace=0.5)
+
+    # Give the faulty workers first pick of the shards
+    for worker in workers[:3]:
+        worker.start()
+    threading.Timer(0.2, lambda: [worker.start() for worker in workers[3:]]).start()
+
+    failed = False
+    for name, detector in detectors.items():
+        expected_frames, expected_candidates, expected_segments = serial_results(detector, video_path,
+                                                                                 args.analysis_fps)
+        merged = coordinator.run(video_path, name, video_info, plan, timeout=120,
+                                 warmup_samples=detector.warmup_samples)
+
+        same = sum(a == b for a, b in zip(expected_frames, merged['frames']))
+        candidates_match = merged['candidates'] == expected_candidates
+        segments_match = merged['animal_segments'] == expected_segments
+        print(f"{name:>15}: {merged['shards']} shards, {same}/{len(expected_frames)} frames match, "
+              f"candidates {'match' if candidates_match else 'DIFFER'}, "
+              f"segments {'match' if segments_match else 'DIFFER'}")
+        failed = (failed or not segments_match or not candidates_match
+                  or same != len(expected_frames))
+
+    # A request whose frame buffer limit is too small is cut short, not over-read
+    merged = coordinator.run(video_path, 'stub', video_info, dict(plan, max_frames=plan['max_frames'] // 3),
+                             timeout=120)
+    print(f"small frame limit: {len(merged['frames'])} frames, truncated={merged['truncated']}")
+    if not merged['truncated']:
+        failed = True
+
+    # A job that fails outright must not leave shards behind for the workers
+    try:
+        coordinator.run(video_path + '.missing', 'stub', video_info, plan, timeout=120)
+        print("job on a missing video did not fail")
+        failed = True
+    except ShardFailed as e:
+        print(f"missing video: {e}")
+
+    # Taken jobs must all have been released or reclaimed
+    leftover = broker.items(JOB_QUEUE) + broker.items(PROCESSING_QUEUE)
+    if leftover:
+        print(f"{len(leftover)} job(s) left on the queues")
+        failed = True
+
+    for worker in workers[1:]:
+        worker.stop(timeout=5)
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Check EmbeddingStore against a brute-force reference
+
+Adds random embeddings for a few videos (with a small shard size, so
+videos span shards), replaces some of them, and checks that loads,
+stats and search results (with and without an excluded video, through
+several chunk sizes) match a brute-force search over the live vectors,
+including after reopening the store from disk. Then rebuilds the store,
+with and without PCA, and checks that dead rows are gone and search still
+matches.
+
+Usage (from backend/):
+    python -m benchmarks.embedding_check --videos 20 --dim 64
+"""
+import argparse
+import os
+import sys
+import tempfile
+import numpy as np
+from utils.embedding_store import EmbeddingStore, rebuild
+
+def random_embeddings(rng, count, dim):
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def brute_force(store, query, k, exclude_video=None):
+    """Top-k (video_id, frame_number) and scores over every live row"""
+    refs, scores = [], []
+    for video_id in store.video_ids():
+        if video_id == exclude_video:
+            continue
+        frame_numbers, embeddings = store.load(video_id)
+        refs.extend((video_id, int(n)) for n in frame_numbers)
+        scores.extend(np.asarray(embeddings, dtype=np.float32) @ query)
+    order = np.argsort(-np.asarray(scores))[:k]
+    return [refs[i] for i in order], [scores[i] for i in order]
+
+def search_matches(store, queries, k=10, projected=True):
+    """Whether search agrees with brute force for every query, chunk size and exclusion"""
+    video_ids = store.video_ids()
+    for i, query in enumerate(queries):
+        exclude = video_ids[i % len(video_ids)] if i % 2 else None
+        stored_query = query if projected else store._project(query[None, :])[0]
+        expected_refs, expected_scores = brute_force(store, stored_query, k, exclude)
+        for chunk_size in (7, 100, 65536):
+            matches = store.search(query, k=k, exclude_video=exclude, chunk_size=chunk_size, projected=projected)
+            if ([(m['video_id'], m['frame_number']) for m in matches] != expected_refs
+                    or not np.allclose([m['score'] for m in matches], expected_scores, atol=1e-5)):
+                return False
+    return True
+
+def raises(exception, fn, *args):
+    try:
+        fn(*args)
+    except exception:
+        return True
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--videos', type=int, default=20)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    workdir = tempfile.mkdtemp()
+    root = os.path.join(workdir, 'store')
+    store = EmbeddingStore(root, shard_size=100)
+    results = {}
+
+    videos = {}
+    for i in range(args.videos):
+        count = int(rng.integers(1, 60))
+        videos[f"video_{i}"] = (np.sort(rng.choice(10000, count, replace=False)),
+                                random_embeddings(rng, count, args.dim))
+        store.add(f"video_{i}", *videos[f"video_{i}"])
+
+    results['add: loads round-trip'] = all(
+        np.array_equal(store.load(v)[0], n) and np.allclose(store.load(v)[1], e, atol=1e-3)
+        for v, (n, e) in videos.items())
+    results['add: spans shards'] = store.stats()['shards'] > 1
+
+    # Replacing a video leaves its old rows behind as dead rows
+    dead = 0
+    for i in range(0, args.videos, 4):
+        video_id = f"video_{i}"
+        dead += len(videos[video_id][0])
+        count = int(rng.integers(1, 60))
+        videos[video_id] = (np.arange(count), random_embeddings(rng, count, args.dim))
+        store.add(video_id, *videos[video_id])
+    stats = store.stats()
+    results['replace: dead rows counted'] = (stats['dead_rows'] == dead and stats['videos'] == args.videos
+                                             and stats['rows'] == sum(len(n) for n, _ in videos.values()))
+    results['replace: loads the new rows'] = all(np.array_equal(store.load(v)[0], n) for v, (n, _) in videos.items())
+
+    queries = random_embeddings(rng, 10, args.dim)
+    results['search'] = search_matches(store, queries)
+    results['search: replaced rows never returned'] = all(
+        (m['video_id'], m['frame_number']) in {(v, int(n)) for v, (ns, _) in videos.items() for n in ns}
+        for q in queries for m in store.search(q, k=50))
+    top = {v: store.search(store.get(v, int(n[0])), k=1, projected=True)[0] for v, (n, _) in videos.items()}
+    results['search: stored frame finds itself'] = all(
+        (top[v]['video_id'], top[v]['frame_number']) == (v, int(n[0])) for v, (n, _) in videos.items())
+
+    reopened = EmbeddingStore(root)
+    results['reopened: same stats and search'] = reopened.stats() == stats and search_matches(reopened, queries)
+
+    results['wrong dimension rejected'] = raises(ValueError, store.add, 'other', [0], random_embeddings(rng, 1, args.dim + 1))
+    results['PCA after adding rejected'] = raises(ValueError, store.fit_pca, queries, 4)
+
+    # Rebuilding drops dead rows and keeps everything else
+    compacted = rebuild(root, os.path.join(workdir, 'compacted'))
+    stats = compacted.stats()
+    results['rebuild: dead rows dropped'] = stats['dead_rows'] == 0 and stats['rows'] == store.stats()['rows']
+    results['rebuild: search unchanged'] = search_matches(compacted, queries)
+    results['rebuild: non-empty target rejected'] = raises(ValueError, rebuild, root, os.path.join(workdir, 'compacted'))
+
+    n_components = args.dim // 4
+    projected = rebuild(root, os.path.join(workdir, 'projected'), n_components=n_components)
+    stats = projected.stats()
+    results['rebuild with PCA: projected'] = (stats['pca'] and stats['dim'] == n_components
+                                              and stats['dead_rows'] == 0 and stats['rows'] == store.stats()['rows'])
+    results['rebuild with PCA: vectors normalised'] = all(
+        np.allclose(np.linalg.norm(np.asarray(projected.load(v)[1], dtype=np.float32), axis=1), 1.0, atol=1e-2)
+        for v in videos)
+    results['rebuild with PCA: raw queries projected'] = search_matches(projected, queries, projected=False)
+    results['rebuild with PCA: only once'] = raises(
+        ValueError, rebuild, os.path.join(workdir, 'projected'), os.path.join(workdir, 'twice'), n_components)
+
+    for name, ok in results.items():
+        print(f"{name:>40}: {'ok' if ok else 'FAILED'}")
+    sys.exit(0 if all(results.values()) else 1)
+
+if __name__ == '__main__':
+    main()
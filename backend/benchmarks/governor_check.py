@@ -0,0 +1,121 @@
+"""
+Check ResourceGovernor's degradation plans and admission control
+
+Plans: a video that fits is left alone, oversized ones are downscaled
+(never below min_width) and then frame-sampled, target_fps absorbs the
+stride, and videos that can't fit even at max_frame_stride are rejected.
+Admission: oversized requests are rejected outright, requests wait while
+the budget is full and time out, waiters are woken when memory is released,
+and model memory is reserved once per detector type.
+
+Usage (from backend/):
+    python -m benchmarks.governor_check
+"""
+import sys
+import threading
+import time
+from utils.resource_governor import (ResourceGovernor, RequestTooLarge, AdmissionTimeout,
+                                     estimate_frame_bytes)
+
+MB = 1024 ** 2
+
+def video(width, height, frame_count, fps=30.0):
+    return {'width': width, 'height': height, 'frame_count': frame_count, 'fps': fps}
+
+def raises(exception, fn, *args, **kwargs):
+    try:
+        fn(*args, **kwargs)
+    except exception:
+        return True
+    return False
+
+def check_plans():
+    """Scale and stride choices for videos of different sizes"""
+    results = {}
+    small = video(640, 480, 300)
+    hd = video(1920, 1080, 300)
+    governor = ResourceGovernor(memory_budget=4096 * MB, per_request_limit=1024 * MB)
+
+    plan = governor.plan(small)
+    results['fits: untouched'] = plan['scale'] == 1.0 and plan['frame_stride'] == 1
+    results['fits: max_frames covers the video'] = plan['max_frames'] >= small['frame_count']
+
+    # 1920x1080x3 x 300 frames is ~1.8GB: downscaling alone gets under 1GB
+    plan = governor.plan(hd)
+    results['downscaled'] = (plan['frame_stride'] == 1 and plan['scale'] < 1.0
+                             and plan['estimated_bytes'] <= governor.per_request_limit)
+    results['downscaled: no lower than min_width'] = plan['scale'] * hd['width'] >= governor.min_width - 1
+
+    # At min_width 300 frames need ~263MB, so a 100MB limit also needs sampling
+    tight = ResourceGovernor(memory_budget=4096 * MB, per_request_limit=100 * MB)
+    plan = tight.plan(hd)
+    results['sampled'] = (plan['scale'] == tight.min_width / hd['width'] and plan['frame_stride'] > 1
+                          and plan['estimated_bytes'] <= tight.per_request_limit)
+    results['sampled: smallest stride that fits'] = estimate_frame_bytes(
+        hd, plan['scale'], plan['frame_stride'] - 1) > tight.per_request_limit
+
+    # The same plan by time: the stride is folded into a lower analysis rate
+    plan_fps = tight.plan(hd, target_fps=30.0 - 1e-9)
+    results['target_fps absorbs the stride'] = (plan_fps['frame_stride'] == 1 and plan_fps['target_fps'] < 30.0
+                                                and plan_fps['estimated_bytes'] <= tight.per_request_limit)
+    plan_fps = governor.plan(hd, target_fps=5.0)
+    results['target_fps: only sampled frames are costed'] = (plan_fps['scale'] == 1.0 and plan_fps['target_fps'] == 5.0
+                                                             and plan_fps['max_frames'] < hd['frame_count'])
+    results['target_fps above native is ignored'] = governor.plan(small, target_fps=60.0)['target_fps'] is None
+
+    # Long videos are sampled down to max_frames even when memory allows more
+    capped = ResourceGovernor(memory_budget=1024 ** 4, max_frames=1000)
+    results['frame cap'] = capped.plan(video(64, 64, 4500))['frame_stride'] == 5
+    results['unknown frame count costed at the cap'] = (capped.plan(video(64, 64, 0))['estimated_bytes']
+                                                        == estimate_frame_bytes(video(64, 64, 1000)))
+
+    tiny = ResourceGovernor(memory_budget=4096 * MB, per_request_limit=1 * MB)
+    results['too large: rejected'] = raises(RequestTooLarge, tiny.plan, hd)
+    return results
+
+def check_admission():
+    """Rejection, queueing, timeouts and model reservations"""
+    results = {}
+    governor = ResourceGovernor(memory_budget=1000, model_overhead=300, queue_timeout=0.2)
+
+    results['over budget: rejected'] = raises(RequestTooLarge, lambda: governor.admit(1001).__enter__())
+
+    with governor.admit(800):
+        results['admitted: reserved'] = governor.in_use == 800
+        start = time.monotonic()
+        results['full: times out'] = raises(AdmissionTimeout, lambda: governor.admit(300).__enter__())
+        results['full: waited for queue_timeout'] = time.monotonic() - start >= governor.queue_timeout
+    results['released'] = governor.in_use == 0
+
+    # A waiter is admitted as soon as the holder releases, well before its timeout
+    admitted = threading.Event()
+    def waiter():
+        with governor.admit(300, timeout=10):
+            admitted.set()
+    holder = governor.admit(800)
+    holder.__enter__()
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.05)
+    results['queued while full'] = not admitted.is_set()
+    holder.__exit__(None, None, None)
+    thread.join(timeout=5)
+    results['woken on release'] = admitted.is_set() and governor.in_use == 0
+
+    governor.reserve_model('a')
+    governor.reserve_model('a')
+    results['model reserved once'] = governor.in_use == 300
+    results['loaded models shrink the request budget'] = raises(RequestTooLarge, lambda: governor.admit(701).__enter__())
+    governor.reserve_model('b')
+    governor.reserve_model('c')
+    results['no room for another model'] = raises(RequestTooLarge, governor.reserve_model, 'd')
+    return results
+
+def main():
+    results = {**check_plans(), **check_admission()}
+    for name, ok in results.items():
+        print(f"{name:>45}: {'ok' if ok else 'FAILED'}")
+    sys.exit(0 if all(results.values()) else 1)
+
+if __name__ == '__main__':
+    main()
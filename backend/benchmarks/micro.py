@@ -0,0 +1,267 @@
+"""
+Micro-benchmarks for the hot paths, with a recorded baseline to compare against
+
+Inputs are synthetic and models are stubs (see benchmarks/stubs.py), so this
+runs on a plain CPU box with no network or weight downloads.
+
+Usage (from backend/):
+    python -m benchmarks.micro run                    # print results
+    python -m benchmarks.micro run --save             # record benchmarks/baseline.json
+    python -m benchmarks.micro compare                # run and compare with the baseline
+    python -m benchmarks.micro compare old.json new.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+import torch
+from models.mobilenet_detector import MobileNetDetector
+from models.ssd_detector import SSDDetector
+from models.rcnn_detector import FasterRCNNDetector
+from models.resnet_detector import ResNetDetector
+from models.yolo_detector import YOLODetector
+from models.temporal_detector import TemporalDetector
+from models.motion_gated_detector import MotionGatedDetector
+from utils.video_processor import extract_frames, find_animal_segments
+from benchmarks.stubs import (StubDetector, StubDetectionModel, StubYOLOModel,
+                              stub_resnet, synthetic_video, write_video)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# name -> setup(workdir) returning a zero-argument callable to time
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a benchmark setup function"""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def _frame(width=640, height=360, seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+@benchmark('extract_frames')
+def bench_extract_frames(workdir):
+    path = write_video(os.path.join(workdir, 'extract.avi'),
+                       synthetic_video(0, num_frames=60, width=640, height=360))
+    return lambda: extract_frames(path)
+
+@benchmark('extract_frames_5fps')
+def bench_extract_frames_5fps(workdir):
+    path = write_video(os.path.join(workdir, 'extract_5fps.avi'),
+                       synthetic_video(0, num_frames=60, width=640, height=360))
+    return lambda: extract_frames(path, target_fps=5)
+
+@benchmark('find_animal_segments')
+def bench_find_animal_segments(workdir):
+    rng = np.random.default_rng(0)
+    # Runs of animal/no-animal frames, like a real video
+    flags = np.repeat(rng.random(500) > 0.5, 20)
+    frame_results = [
+        {'has_animals': bool(flag), 'detections': [], 'frame_number': i}
+        for i, flag in enumerate(flags)
+    ]
+    return lambda: find_animal_segments(frame_results, 30.0)
+
+@benchmark('temporal_sequence_features')
+def bench_temporal_sequence_features(workdir):
+    detector = TemporalDetector(StubDetector(), sequence_length=5)
+    session = detector.create_session()
+    rng = np.random.default_rng(0)
+    buffer = [
+        {
+            'has_animals': True,
+            'detections': [
+                {'class': f"class_{int(c)}", 'confidence': float(s), 'bbox': [10.0, 20.0, 110.0, 220.0]}
+                for c, s in zip(rng.integers(0, 30, 10), rng.random(10))
+            ]
+        }
+        for _ in range(5)
+    ]
+    return lambda: detector._extract_sequence_features(buffer, session.state)
+
+@benchmark('temporal_detect')
+def bench_temporal_detect(workdir):
+    torch.manual_seed(0)
+    detector = TemporalDetector(StubDetector(), sequence_length=5).load()
+    frames = synthetic_video(0, num_frames=20)
+    session = detector.create_session()
+
+    def run():
+        for frame in frames:
+            detector.detect(frame, session)
+    return run
+
+@benchmark('motion_gated_detect')
+def bench_motion_gated_detect(workdir):
+    detector = MotionGatedDetector(StubDetector(), warmup_frames=5).load()
+    frames = synthetic_video(0, num_frames=20, width=640, height=360)
+
+    def run():
+        session = detector.create_session()
+        for frame in frames:
+            detector.detect(frame, session)
+    return run
+
+def _torchvision_bench(detector_cls):
+    def setup(workdir):
+        detector = detector_cls()
+        detector.model = StubDetectionModel()
+        frame = _frame()
+        return lambda: detector.detect(frame)
+    return setup
+
+benchmark('mobilenet_detect')(_torchvision_bench(MobileNetDetector))
+benchmark('ssd_detect')(_torchvision_bench(SSDDetector))
+benchmark('faster_rcnn_detect')(_torchvision_bench(FasterRCNNDetector))
+
+@benchmark('resnet_detect')
+def bench_resnet_detect(workdir):
+    detector = stub_resnet(ResNetDetector())
+    frame = _frame()
+    return lambda: detector.detect(frame)
+
+@benchmark('yolo_detect')
+def bench_yolo_detect(workdir):
+    detector = YOLODetector()
+    detector.model = StubYOLOModel()
+    frame = _frame()
+    return lambda: detector.detect(frame)
+
+def time_callable(fn, rounds=7, min_round_time=0.2):
+    """
+    Time a callable pytest-benchmark style
+
+    The iteration count is calibrated so each round lasts at least
+    min_round_time, then per-call times are collected over several rounds.
+
+    Returns:
+        dict: Per-call seconds (min, median, stdev) plus rounds/iterations
+    """
+    fn()  # Warm-up
+
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+        iterations *= 2
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter() - start) / iterations)
+
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rounds': rounds,
+        'iterations': iterations
+    }
+
+def run_benchmarks(names=None, rounds=7):
+    """Run the selected benchmarks and return a results document"""
+    # Single-threaded torch keeps numbers comparable across machines/runs
+    torch.set_num_threads(1)
+
+    workdir = tempfile.mkdtemp(prefix='fuzzyfinder-bench-')
+    results = {}
+    try:
+        for name, setup in BENCHMARKS.items():
+            if names and not any(n in name for n in names):
+                continue
+            results[name] = time_callable(setup(workdir), rounds=rounds)
+            print(f"{name:>28}: {results[name]['median'] * 1e3:10.3f} ms (min {results[name]['min'] * 1e3:.3f} ms)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'torch': torch.__version__
+        },
+        'benchmarks': results
+    }
+
+def compare(baseline, current, threshold=0.25, stat='median'):
+    """
+    Compare two results documents
+
+    Returns:
+        list: (name, baseline_seconds, current_seconds, ratio, regressed) rows
+    """
+    rows = []
+    for name, base in baseline['benchmarks'].items():
+        if name not in current['benchmarks']:
+            continue
+        now = current['benchmarks'][name]
+        ratio = now[stat] / base[stat] if base[stat] > 0 else float('inf')
+        rows.append((name, base[stat], now[stat], ratio, ratio > 1 + threshold))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks')
+    run_parser.add_argument('-k', dest='names', action='append', help='Only run benchmarks containing this string')
+    run_parser.add_argument('--rounds', type=int, default=7)
+    run_parser.add_argument('--output', help='Write results to this JSON file')
+    run_parser.add_argument('--save', action='store_true', help=f'Record results as the baseline ({BASELINE_PATH})')
+
+    compare_parser = subparsers.add_parser('compare', help='Flag slowdowns against a baseline')
+    compare_parser.add_argument('baseline', nargs='?', default=BASELINE_PATH)
+    compare_parser.add_argument('current', nargs='?', help='Results JSON (default: run the benchmarks now)')
+    compare_parser.add_argument('-k', dest='names', action='append', help='Only run benchmarks containing this string')
+    compare_parser.add_argument('--rounds', type=int, default=7)
+    compare_parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown as a fraction (0.25 = 25%%)')
+    compare_parser.add_argument('--stat', choices=['min', 'median'], default='median')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run_benchmarks(args.names, args.rounds)
+        for path in filter(None, [args.output, BASELINE_PATH if args.save else None]):
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"Saved results to {path}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run_benchmarks(args.names, args.rounds)
+
+    if baseline.get('machine') != current.get('machine'):
+        print("Warning: baseline was recorded on a different machine/environment")
+
+    regressions = 0
+    for name, base, now, ratio, regressed in compare(baseline, current, args.threshold, args.stat):
+        flag = 'SLOWER' if regressed else 'ok'
+        print(f"{name:>28}: {base * 1e3:10.3f} ms -> {now * 1e3:10.3f} ms ({ratio:5.2f}x) {flag}")
+        regressions += regressed
+
+    if regressions:
+        print(f"{regressions} benchmark(s) slowed down by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare full-frame inference against motion-gated inference on a video
+
+Usage (from backend/):
+    python -m benchmarks.motion_gating path/to/video.mp4 --detector mobilenet
+"""
+import argparse
+import time
+from models.resnet_detector import ResNetDetector
+from models.mobilenet_detector import MobileNetDetector
+from models.ssd_detector import SSDDetector
+from models.yolo_detector import YOLODetector
+from models.motion_gated_detector import MotionGatedDetector
+from utils.video_processor import extract_frames, find_animal_segments
+
+BASE_DETECTORS = {
+    'resnet': lambda: ResNetDetector(confidence_threshold=0.3),
+    'mobilenet': lambda: MobileNetDetector(confidence_threshold=0.4),
+    'ssd': lambda: SSDDetector(confidence_threshold=0.4),
+    'yolo': lambda: YOLODetector(confidence_threshold=0.4),
+}
+
+def run(detector, video_data):
+    """Run a detector over every extracted frame and summarise speed and recall"""
+    detector.load()
+    frames = video_data['frames']
+
+    frame_results = []
+    session = detector.create_session()
+    start = time.perf_counter()
+    for frame, frame_number, timestamp in zip(frames, video_data['frame_numbers'], video_data['timestamps']):
+        result = detector.detect(frame, session)
+        # Place results by original frame, so skipped frames don't shrink segments
+        result['frame_number'] = frame_number
+        result['timestamp'] = timestamp
+        frame_results.append(result)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'detector': detector.name,
+        'seconds': elapsed,
+        'ms_per_frame': 1000 * elapsed / max(len(frames), 1),
+        'frames_with_animals': sum(r['has_animals'] for r in frame_results),
+        'detections': sum(len(r['detections']) for r in frame_results),
+        'segments': len(find_animal_segments(frame_results, video_data['fps']))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--detector', default='mobilenet', choices=list(BASE_DETECTORS))
+    parser.add_argument('--skip-frames', type=int, default=0)
+    args = parser.parse_args()
+
+    video_data = extract_frames(args.video, skip_frames=args.skip_frames)
+    frames = video_data['frames']
+    print(f"{len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    baseline = run(BASE_DETECTORS[args.detector](), video_data)
+    gated = run(MotionGatedDetector(BASE_DETECTORS[args.detector]()), video_data)
+
+    for stats in (baseline, gated):
+        print(f"{stats['detector']:>20}: {stats['ms_per_frame']:8.1f} ms/frame, "
+              f"{stats['frames_with_animals']} frames with animals, "
+              f"{stats['detections']} detections, {stats['segments']} segments")
+    print(f"speedup: {baseline['seconds'] / max(gated['seconds'], 1e-9):.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Check that /resegment re-filters cached candidates exactly like a fresh pass
+
+Each video is processed once per detector, then re-filtered through
+/resegment at several thresholds and class filters. Every answer must
+match a /process-video request made with the same filter, detections must
+respect the filter, and malformed filters must be rejected with a 400.
+Uses stub models through the Flask test client, so it needs no weights or
+network.
+
+Usage (from backend/):
+    python -m benchmarks.resegment_check --videos 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+from models.temporal_detector import TemporalDetector
+from models.motion_gated_detector import MotionGatedDetector
+from benchmarks.concurrency_stress import StubResNetDetector
+from benchmarks.stubs import StubDetector, synthetic_video, write_video
+
+THRESHOLDS = (None, 0.1, 0.5, 0.9)
+
+BAD_FILTERS = (
+    {'threshold': 'high'},
+    {'threshold': True},
+    {'threshold': 'nan'},
+    {'threshold': 'inf'},
+    {'classes': 5},
+    {'classes': ['dog', 1]},
+    {'classes': {'dog': True}},
+)
+
+# The temporal detector thresholds its sequence score; its detections are the
+# base detector's at base_threshold
+SCORE_THRESHOLDED = ('temporal_stub',)
+
+# Classifiers report only their top-1 class unless a class filter is given
+TOP1 = ('resnet_stub',)
+
+def check_video(client, detector_type, path):
+    """Mismatched filters for one video and detector (0 means all passed)"""
+    def process(**params):
+        with open(path, 'rb') as f:
+            data = {'video': (f, os.path.basename(path)), 'detector': detector_type}
+            data.update({k: str(v) for k, v in params.items() if v is not None})
+            response = client.post('/process-video', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    def resegment(**params):
+        response = client.post('/resegment', json=dict(params, video_id=video_id, detector=detector_type))
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    first = process(threshold=0.0)
+    video_id = first['metadata']['video_id']
+
+    # Filter by the most common class, so the filter actually removes something
+    seen = [d['class'] for frame in first['frames'] for d in frame['detections']]
+    class_name = max(set(seen), key=seen.count) if seen else 'dog'
+
+    failures = 0
+    animal_frames = None
+    for threshold in THRESHOLDS:
+        for classes in (None, class_name):
+            expected = process(threshold=threshold, classes=classes)
+            actual = resegment(threshold=threshold, classes=classes)
+
+            detections = [d for frame in actual['frames'] for d in frame['detections']]
+            ok = (actual['frames'] == expected['frames']
+                  and actual['animal_segments'] == expected['animal_segments']
+                  and (classes is None or all(d['class'] == classes for d in detections))
+                  and (threshold is None or detector_type in SCORE_THRESHOLDED
+                       or all(d['confidence'] >= threshold for d in detections))
+                  and (classes is not None or detector_type not in TOP1
+                       or all(len(frame['detections']) <= 1 for frame in actual['frames'])))
+            failures += not ok
+
+        # A higher threshold can only drop frames
+        frames = {f['frame_number'] for f in actual['frames'] if f['has_animals']}
+        if animal_frames is not None and not frames <= animal_frames:
+            failures += 1
+        animal_frames = frames
+
+    # The list form of a class filter means the same as the string form
+    failures += resegment(classes=[class_name]) != resegment(classes=class_name)
+
+    for params in BAD_FILTERS:
+        response = client.post('/resegment', json=dict(params, video_id=video_id, detector=detector_type))
+        failures += response.status_code != 400
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--videos', type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['FUZZYFINDER_EMBEDDINGS_DIR'] = os.path.join(workdir, 'embeddings')
+    os.environ['FUZZYFINDER_MODE'] = 'local'
+    import server
+    from models.registry import DETECTORS
+
+    DETECTORS['stub'] = lambda: StubDetector()
+    DETECTORS['temporal_stub'] = lambda: TemporalDetector(StubDetector(), sequence_length=5)
+    DETECTORS['motion_stub'] = lambda: MotionGatedDetector(StubDetector(), warmup_frames=5)
+    DETECTORS['resnet_stub'] = lambda: StubResNetDetector(confidence_threshold=0.1)
+
+    paths = [write_video(os.path.join(workdir, f"video_{i}.avi"), synthetic_video(i))
+             for i in range(args.videos)]
+    client = server.app.test_client()
+
+    failed = False
+    for detector_type in ('stub', 'temporal_stub', 'motion_stub', 'resnet_stub'):
+        failures = sum(check_video(client, detector_type, path) for path in paths)
+        print(f"{detector_type:>15}: {failures} failed checks over {len(paths)} videos")
+        failed = failed or failures > 0
+
+    missing = client.post('/resegment', json={'video_id': 'missing', 'detector': 'stub'}).status_code
+    no_id = client.post('/resegment', json={'detector': 'stub'}).status_code
+    print(f"{'unknown video':>15}: {missing}, missing video_id: {no_id}")
+    failed = failed or missing != 404 or no_id != 400
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Check target_fps sampling in extract_frames and segment ends in find_animal_segments
+
+Sampling: a target_fps pass keeps the first frame of every 1/target_fps
+slot of video time, and a pass that seeks to start_frame (as shards do)
+keeps exactly the frames a full pass keeps from there on, with the same
+pixels. max_frames truncates and reports it.
+
+Segments: a segment closes just before the first analysed frame without
+animals, and a segment still open at the end is extended by the spacing
+between the last two analysed frames.
+
+Usage (from backend/):
+    python -m benchmarks.sampling_check
+"""
+import math
+import os
+import sys
+import tempfile
+import numpy as np
+from utils.video_processor import extract_frames, find_animal_segments
+from benchmarks.stubs import synthetic_video, write_video
+
+VIDEO_FPS = (30.0, 25.0)
+TARGET_FPS = (1.0, 7.0, 10.0, 12.5, 15.0)
+STARTS = (1, 2, 3, 7, 29, 30, 31, 64, 100, 119)
+
+def expected_frames(frame_count, fps, target_fps):
+    """Frame numbers a target_fps pass keeps from a constant frame rate video"""
+    def slot(n):
+        return math.floor(n * target_fps / fps + 1e-6)
+    return [n for n in range(frame_count) if n == 0 or slot(n) != slot(n - 1)]
+
+def check_sampling(workdir):
+    results = {}
+    for fps in VIDEO_FPS:
+        path = write_video(os.path.join(workdir, f"video_{fps:g}.avi"), synthetic_video(0, 120), fps=fps)
+        full = extract_frames(path)
+        results[f"{fps:g}fps native: every frame"] = full['frame_numbers'] == list(range(len(full['frames'])))
+        results[f"{fps:g}fps at its own rate: every frame"] = (
+            extract_frames(path, target_fps=fps)['frame_numbers'] == full['frame_numbers'])
+
+        for target_fps in TARGET_FPS:
+            sampled = extract_frames(path, target_fps=target_fps)
+            numbers = sampled['frame_numbers']
+            label = f"{fps:g}fps at {target_fps:g}"
+            results[label] = numbers == expected_frames(len(full['frames']), fps, target_fps)
+            results[f"{label}: same pixels"] = all(
+                np.array_equal(frame, full['frames'][n]) for frame, n in zip(sampled['frames'], numbers))
+
+            # Seeking (with or without an end) keeps the frames a full pass keeps
+            seeks = [extract_frames(path, target_fps=target_fps, start_frame=start)['frame_numbers']
+                     == [n for n in numbers if n >= start] for start in STARTS]
+            ranges = [extract_frames(path, target_fps=target_fps, start_frame=start, end_frame=start + 40)
+                      ['frame_numbers'] == [n for n in numbers if start <= n < start + 40] for start in STARTS]
+            results[f"{label}: after seeks"] = all(seeks) and all(ranges)
+
+        limited = extract_frames(path, target_fps=10.0, max_frames=5)
+        results[f"{fps:g}fps: max_frames truncates"] = (
+            limited['truncated'] and limited['frame_numbers'] == expected_frames(120, fps, 10.0)[:5])
+        exact = extract_frames(path, max_frames=len(full['frames']))
+        results[f"{fps:g}fps: max_frames at the frame count"] = not exact['truncated'] and len(exact['frames']) == 120
+    return results
+
+def frames(flags, step=1, fps=30.0):
+    """Frame results for analysed frames every `step` frames"""
+    return [{'has_animals': flag, 'frame_number': i * step, 'timestamp': i * step / fps}
+            for i, flag in enumerate(flags)]
+
+def segment(start_frame, end_frame, start_time, end_time):
+    return {'start_frame': start_frame, 'end_frame': end_frame, 'start_time': start_time,
+            'end_time': end_time, 'duration': end_time - start_time}
+
+def close(a, b):
+    return (len(a) == len(b) and all(x.keys() == y.keys() and all(
+        math.isclose(x[k], y[k], abs_tol=1e-9) for k in x) for x, y in zip(a, b)))
+
+def check_segments():
+    fps = 30.0
+    cases = {
+        # Every frame analysed: segments are exactly the animal frames
+        'native: closes at the last animal frame': (
+            find_animal_segments(frames([0, 1, 1, 0, 0]), fps), [segment(1, 2, 1 / fps, 2 / fps)]),
+        'native: open at the end, not extended': (
+            find_animal_segments(frames([0, 0, 1, 1]), fps), [segment(2, 3, 2 / fps, 3 / fps)]),
+        # Every 3rd frame analysed: frames 3..8 stand for animal frames up to 8
+        'sampled: closes before the next analysed frame': (
+            find_animal_segments(frames([0, 1, 1, 0], step=3), fps), [segment(3, 8, 3 / fps, 8 / fps)]),
+        'sampled: open at the end, extended by the spacing': (
+            find_animal_segments(frames([0, 1, 1], step=3), fps), [segment(3, 8, 3 / fps, 8 / fps)]),
+        'sampled: lone frame at the end': (
+            find_animal_segments(frames([0, 0, 1], step=3), fps), [segment(6, 8, 6 / fps, 8 / fps)]),
+        'single analysed frame': (
+            find_animal_segments(frames([1]), fps), [segment(0, 0, 0.0, 0.0)]),
+        'two segments': (
+            find_animal_segments(frames([1, 0, 1, 0], step=2), fps),
+            [segment(0, 1, 0.0, 1 / fps), segment(4, 5, 4 / fps, 5 / fps)]),
+        # Results without frame numbers are placed by their index
+        'no frame numbers': (
+            find_animal_segments([{'has_animals': f} for f in (0, 1, 1, 0)], fps),
+            [segment(1, 2, 1 / fps, 2 / fps)]),
+        # Timestamps win over frame_number / fps (variable frame rate)
+        'timestamps override frame numbers': (
+            find_animal_segments([{'has_animals': f, 'frame_number': n, 'timestamp': t}
+                                  for f, n, t in ((1, 0, 0.0), (1, 1, 0.1), (0, 2, 0.5))], fps),
+            [segment(0, 1, 0.0, 0.5 - 1 / fps)]),
+        'nothing found': (find_animal_segments(frames([0, 0, 0]), fps), []),
+    }
+    return {name: close(actual, expected) for name, (actual, expected) in cases.items()}
+
+def main():
+    results = {**check_sampling(tempfile.mkdtemp()), **check_segments()}
+    for name, ok in results.items():
+        print(f"{name:>50}: {'ok' if ok else 'FAILED'}")
+    sys.exit(0 if all(results.values()) else 1)
+
+if __name__ == '__main__':
+    main()
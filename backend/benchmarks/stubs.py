@@ -0,0 +1,189 @@
+"""
+Weight-free stand-ins used by the benchmarks
+
+Everything here is deterministic and runs on CPU without downloads, so
+benchmark numbers only reflect our own pre/post-processing code.
+"""
+import time
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from models.base_detector import BaseDetector, make_candidates
+
+class StubDetector(BaseDetector):
+    """Deterministic detector that 'sees' an animal where the frame is bright"""
+
+    def __init__(self, confidence_threshold=0.4):
+        self.model = None
+        self.confidence_threshold = confidence_threshold
+        self._name = "stub"
+
+    def load(self):
+        self.model = object()
+        return self
+
+    CLASS_NAMES = {0: 'dog', 1: 'cat'}
+    animal_class_ids = (0, 1)
+
+    def detect_raw_batch(self, frames, session=None):
+        self.ensure_loaded()
+        return [self._candidates(frame) for frame in frames]
+
+    def _candidates(self, frame):
+        # Score is the fraction of bright pixels, boxed by their extent
+        bright = frame.max(axis=2) > 200
+        score = float(min(1.0, bright.mean() * 50))
+        if score < self.candidate_floor:
+            return make_candidates([], [], np.zeros((0, 4)))
+
+        ys, xs = np.nonzero(bright)
+        return make_candidates(
+            [1 if score > 0.6 else 0],
+            [score],
+            [[float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())]]
+        )
+
+    def class_name(self, class_id):
+        return self.CLASS_NAMES[class_id]
+
+    @property
+    def name(self):
+        return self._name
+
+class StubDetectionModel:
+    """Mimics a torchvision detection model: fixed boxes/labels/scores per image"""
+
+    def __init__(self, num_boxes=100, num_classes=91, seed=0):
+        generator = torch.Generator().manual_seed(seed)
+        xy = torch.rand((num_boxes, 2), generator=generator) * 500
+        wh = torch.rand((num_boxes, 2), generator=generator) * 100 + 1
+        self.boxes = torch.cat([xy, xy + wh], dim=1)
+        self.labels = torch.randint(1, num_classes, (num_boxes,), generator=generator)
+        self.scores = torch.rand((num_boxes,), generator=generator)
+
+    def __call__(self, images):
+        return [
+            {'boxes': self.boxes, 'labels': self.labels, 'scores': self.scores}
+            for _ in images
+        ]
+
+class StubYOLOBoxes:
+    """Column tensors like ultralytics' Boxes"""
+
+    def __init__(self, cls, conf, xyxy):
+        self.cls = torch.tensor(cls, dtype=torch.float32)
+        self.conf = torch.tensor(conf, dtype=torch.float32)
+        self.xyxy = torch.tensor(xyxy, dtype=torch.float32).reshape(-1, 4)
+
+class StubYOLOResult:
+    def __init__(self, boxes, names):
+        self.boxes = boxes
+        self.names = names
+
+class StubYOLOModel:
+    """Mimics an ultralytics YOLO model: one result of fixed boxes per image"""
+
+    NAMES = {0: 'person', 14: 'bird', 15: 'cat', 16: 'dog', 17: 'horse', 56: 'chair'}
+
+    def __init__(self, num_boxes=50, seed=0):
+        rng = np.random.default_rng(seed)
+        xy = rng.random((num_boxes, 2)) * 500
+        self.boxes = StubYOLOBoxes(
+            rng.choice(list(self.NAMES), num_boxes).tolist(),
+            rng.random(num_boxes).tolist(),
+            np.concatenate([xy, xy + rng.random((num_boxes, 2)) * 100 + 1], axis=1).tolist()
+        )
+
+    @property
+    def names(self):
+        return self.NAMES
+
+    def __call__(self, frames, **kwargs):
+        return [StubYOLOResult(self.boxes, self.NAMES) for _ in frames]
+
+class StatefulStubYOLOModel(StubYOLOModel):
+    """
+    Stub YOLO model that, like the ultralytics predictor, keeps the batch
+    it is working on on itself, so overlapping calls mix up their frames
+
+    Boxes depend on each frame's bright pixels, so mixed-up calls show up
+    as wrong results.
+    """
+
+    def __call__(self, frames, **kwargs):
+        self._batch = list(frames)
+        time.sleep(0.001)  # Give other threads a chance to overlap
+        return [StubYOLOResult(self._boxes(frame), self.NAMES) for frame in self._batch]
+
+    def _boxes(self, frame):
+        bright = frame.max(axis=2) > 200
+        if not bright.any():
+            return StubYOLOBoxes([], [], [])
+        ys, xs = np.nonzero(bright)
+        return StubYOLOBoxes([16, 0], [float(min(1.0, bright.mean() * 50)), 0.9],
+                             [[xs.min(), ys.min(), xs.max(), ys.max()], [0, 0, 10, 10]])
+
+def stub_resnet(detector, seed=0, logit_scale=1.0):
+    """
+    Give a ResNetDetector a tiny stand-in backbone
+
+    Keeps the real transforms and the 2048 -> 1000 head so preprocessing
+    and post-processing cost match the real detector.
+
+    Args:
+        detector: ResNetDetector to modify in place
+        seed: Seed for the stand-in weights
+        logit_scale: Multiplies the head's weights; the default gives a
+            near-uniform softmax (no candidates), larger values give
+            peaked, frame-dependent class scores
+    """
+    torch.manual_seed(seed)
+    detector.feature_extractor = nn.Sequential(
+        nn.AdaptiveAvgPool2d(1),
+        nn.Conv2d(3, 2048, kernel_size=1, bias=False)
+    ).eval()
+    detector.imagenet_labels = [f"class_{i}" for i in range(1000)]
+    detector.imagenet_labels[::7] = ['tabby cat'] * len(detector.imagenet_labels[::7])
+
+    from torchvision import transforms
+    detector.transform = transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                             std=[0.229, 0.224, 0.225])
+    ])
+
+    model = nn.Module()
+    model.fc = nn.Linear(2048, 1000).eval()
+    with torch.no_grad():
+        model.fc.weight.mul_(logit_scale)
+    detector.model = model
+    return detector
+
+def synthetic_video(seed, num_frames=40, width=320, height=240):
+    """Noisy static background with a bright square moving across it"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 120, (height, width, 3), dtype=np.uint8)
+    size = int(rng.integers(12, 48))
+    speed = int(rng.integers(2, 8))
+    y = int(rng.integers(0, height - size))
+
+    frames = []
+    for i in range(num_frames):
+        frame = background.copy()
+        x = (10 + i * speed) % (width - size)
+        if (i // 10) % 2 == 0:
+            frame[y:y + size, x:x + size] = 255
+        frames.append(frame)
+    return frames
+
+def write_video(path, frames, fps=30.0):
+    """Encode frames to an MJPG .avi (needs no external codecs)"""
+    height, width = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return path
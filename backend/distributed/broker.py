@@ -0,0 +1,206 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+
+def encode(message):
+    """Serialise a message canonically, so equal messages encode identically"""
+    return json.dumps(message, sort_keys=True)
+
+class Broker(ABC):
+    """
+    Minimal queue + key/value interface between the API front and workers
+
+    Messages and values are JSON-serialisable dicts. The operations map
+    one-to-one onto Redis commands (LPUSH/BRPOP/BRPOPLPUSH/LREM/LRANGE,
+    SET EX/GET/DEL), so the in-process broker is a faithful stand-in for
+    tests and development.
+    """
+
+    @abstractmethod
+    def push(self, queue_name, message, ttl=None):
+        """Append a message to a queue, optionally expiring the queue after ttl seconds"""
+        pass
+
+    @abstractmethod
+    def pop(self, queue_name, timeout=1.0):
+        """Remove and return the oldest message, or None after timeout seconds"""
+        pass
+
+    @abstractmethod
+    def pop_to(self, queue_name, processing_name, timeout=1.0):
+        """
+        Atomically move the oldest message onto a processing list and return it
+
+        The message stays on the processing list until removed, so a
+        consumer that dies after popping doesn't lose it.
+        """
+        pass
+
+    @abstractmethod
+    def remove(self, queue_name, message):
+        """Remove one copy of a message from a queue"""
+        pass
+
+    @abstractmethod
+    def items(self, queue_name):
+        """Return the messages in a queue, without removing them"""
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        """Store a value, optionally expiring after ttl seconds"""
+        pass
+
+    @abstractmethod
+    def get(self, key):
+        """Return a stored value, or None if absent or expired"""
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove a stored value or a whole queue"""
+        pass
+
+class InMemoryBroker(Broker):
+    """Thread-safe in-process broker with Redis semantics"""
+
+    def __init__(self):
+        self._queues = defaultdict(deque)
+        self._queue_expiry = {}
+        self._values = {}
+        self._condition = threading.Condition()
+
+    def push(self, queue_name, message, ttl=None):
+        # Round-trip through JSON so anything Redis would reject fails here too
+        payload = encode(message)
+        with self._condition:
+            self._expire_queue(queue_name)
+            self._queues[queue_name].append(payload)
+            if ttl is not None:
+                self._queue_expiry[queue_name] = time.monotonic() + ttl
+            self._condition.notify_all()
+
+    def pop(self, queue_name, timeout=1.0):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._expire_queue(queue_name)
+            while not self._queues[queue_name]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return json.loads(self._queues[queue_name].popleft())
+
+    def pop_to(self, queue_name, processing_name, timeout=1.0):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._queues[queue_name]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            payload = self._queues[queue_name].popleft()
+            self._queues[processing_name].append(payload)
+            return json.loads(payload)
+
+    def remove(self, queue_name, message):
+        payload = encode(message)
+        with self._condition:
+            try:
+                self._queues[queue_name].remove(payload)
+            except ValueError:
+                pass
+
+    def items(self, queue_name):
+        with self._condition:
+            self._expire_queue(queue_name)
+            return [json.loads(payload) for payload in self._queues[queue_name]]
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._condition:
+            self._values[key] = (json.dumps(value), expires)
+
+    def get(self, key):
+        with self._condition:
+            if key not in self._values:
+                return None
+            payload, expires = self._values[key]
+            if expires is not None and expires <= time.monotonic():
+                del self._values[key]
+                return None
+            return json.loads(payload)
+
+    def delete(self, key):
+        with self._condition:
+            self._values.pop(key, None)
+            self._queues.pop(key, None)
+            self._queue_expiry.pop(key, None)
+
+    def _expire_queue(self, queue_name):
+        expires = self._queue_expiry.get(queue_name)
+        if expires is not None and expires <= time.monotonic():
+            self._queues.pop(queue_name, None)
+            del self._queue_expiry[queue_name]
+
+class RedisBroker(Broker):
+    """Broker backed by a Redis server (shared by API fronts and workers on any node)"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("redis package not found. Install with: pip install redis")
+        self._redis = redis.Redis.from_url(url)
+
+    def push(self, queue_name, message, ttl=None):
+        if ttl is None:
+            self._redis.lpush(queue_name, encode(message))
+            return
+        pipeline = self._redis.pipeline()
+        pipeline.lpush(queue_name, encode(message))
+        pipeline.expire(queue_name, max(1, int(round(ttl))))
+        pipeline.execute()
+
+    def pop(self, queue_name, timeout=1.0):
+        # BRPOP takes whole seconds; 0 would block forever
+        item = self._redis.brpop(queue_name, timeout=max(1, int(round(timeout))))
+        return None if item is None else json.loads(item[1])
+
+    def pop_to(self, queue_name, processing_name, timeout=1.0):
+        payload = self._redis.brpoplpush(queue_name, processing_name, timeout=max(1, int(round(timeout))))
+        return None if payload is None else json.loads(payload)
+
+    def remove(self, queue_name, message):
+        self._redis.lrem(queue_name, 1, encode(message))
+
+    def items(self, queue_name):
+        return [json.loads(payload) for payload in self._redis.lrange(queue_name, 0, -1)]
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(key, json.dumps(value), ex=None if ttl is None else max(1, int(round(ttl))))
+
+    def get(self, key):
+        payload = self._redis.get(key)
+        return None if payload is None else json.loads(payload)
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+def connect_broker(url):
+    """
+    Create a broker from a URL
+
+    Args:
+        url: 'memory://' for the in-process broker, or a redis:// URL
+
+    Returns:
+        Broker: Connected broker
+    """
+    if url.startswith('memory://'):
+        return InMemoryBroker()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBroker(url)
+    raise ValueError(f"Unsupported broker URL: {url}")
@@ -0,0 +1,172 @@
+import time
+import uuid
+from utils.video_processor import find_animal_segments
+from distributed.sharding import plan_shards, merge_shard_results
+from distributed.worker import JOB_QUEUE, PROCESSING_QUEUE, result_queue, lease_key, closed_key
+
+class ShardFailed(RuntimeError):
+    """Raised when a shard keeps failing or the job runs out of time"""
+    pass
+
+class Coordinator:
+    """
+    Splits a video into shards, hands them to workers and merges the results
+
+    Runs in the (stateless) API front. A shard taken by a worker sits on
+    the processing list until reported; if it has no live lease for longer
+    than claim_grace (its worker died, hung or crashed), or its worker
+    reports an error, it is requeued, up to max_attempts.
+    """
+
+    def __init__(self, broker, shard_seconds=30.0, warmup_seconds=2.0, warmup_samples=10,
+                 max_attempts=3, poll_interval=0.5, claim_grace=5.0):
+        self.broker = broker
+        self.shard_seconds = shard_seconds
+        self.warmup_seconds = warmup_seconds
+        self.warmup_samples = warmup_samples
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.claim_grace = claim_grace
+
+    def run(self, video_path, detector_type, video_info, plan, threshold=None, classes=None,
+            timeout=3600.0, warmup_samples=0):
+        """
+        Process a video across the worker pool
+
+        Args:
+            video_path: Path to the video on storage shared with the workers
+            detector_type: Key into the detector registry
+            video_info: Metadata from probe_video
+            plan: Decode plan from ResourceGovernor.plan
+            threshold: Optional confidence threshold override
+            classes: Optional class names to keep
+            timeout: Seconds to wait for all shards
+            warmup_samples: Analysed frames the detector needs before each
+                shard (see BaseDetector.warmup_samples); at least the
+                coordinator's own warmup_samples are used
+
+        Returns:
+            dict: frames (merged, in frame order), candidates (raw candidates
+                of the same frames, see encode_candidates), truncated (a
+                shard hit its frame buffer limit), animal_segments and
+                shard count
+        """
+        job_id = uuid.uuid4().hex
+        # Warm up over enough analysed frames for the detector's state (temporal
+        # buffers, background models), however sparsely the video is sampled
+        sample_rate = plan.get('target_fps') or video_info['fps'] / plan['frame_stride']
+        warmup_seconds = self.warmup_seconds
+        if sample_rate > 0:
+            warmup_seconds = max(warmup_seconds, max(self.warmup_samples, warmup_samples) / sample_rate)
+        # Each shard gets its share of the request's frame buffer limit
+        shards = plan_shards(video_info['frame_count'], video_info['fps'],
+                             self.shard_seconds, warmup_seconds,
+                             sample_rate, plan.get('max_frames'))
+
+        jobs = {}
+        for shard in shards:
+            jobs[shard['shard_id']] = dict(
+                shard,
+                job_id=job_id,
+                attempt=1,
+                video_path=video_path,
+                detector=detector_type,
+                frame_stride=plan['frame_stride'],
+                target_fps=plan.get('target_fps'),
+                scale=plan['scale'],
+                threshold=threshold,
+                classes=classes
+            )
+            self.broker.push(JOB_QUEUE, jobs[shard['shard_id']])
+
+        try:
+            results = self._collect(job_id, jobs, timeout)
+        finally:
+            # Finished or failed, drop the job's leftovers before the caller
+            # deletes the video
+            self._close(job_id)
+
+        frames = merge_shard_results(results[shard_id]['frames'] for shard_id in sorted(results))
+        candidates = merge_shard_results(results[shard_id]['candidates'] for shard_id in sorted(results))
+
+        # Segments are found on the merged frames, so they run across shard boundaries
+        return {
+            'frames': frames,
+            'candidates': candidates,
+            'truncated': any(results[shard_id].get('truncated', False) for shard_id in results),
+            'animal_segments': find_animal_segments(frames, video_info['fps']),
+            'shards': len(jobs)
+        }
+
+    def _collect(self, job_id, jobs, timeout):
+        """Wait for every shard's result, retrying failed and orphaned shards"""
+        results = {}
+        unleased = {}
+        deadline = time.monotonic() + timeout
+        while len(results) < len(jobs):
+            if time.monotonic() > deadline:
+                raise ShardFailed(f"Timed out with {len(jobs) - len(results)} shard(s) outstanding")
+
+            message = self.broker.pop(result_queue(job_id), timeout=self.poll_interval)
+            if message is not None:
+                shard_id = message['shard_id']
+                if shard_id in results:
+                    continue  # Late duplicate from a retried shard
+                if 'error' in message:
+                    print(f"shard {shard_id} failed on {message['worker_id']}: {message['error']}")
+                    self._retry(jobs[shard_id])
+                else:
+                    results[shard_id] = message
+
+            self._requeue_orphans(job_id, jobs, results, unleased)
+
+        return results
+
+    def _close(self, job_id):
+        """
+        Stop a job: workers skip its queued shards and drop results of
+        shards still running, and its result queue is deleted
+        """
+        self.broker.set(closed_key(job_id), True, ttl=24 * 3600)
+        for queue_name in (JOB_QUEUE, PROCESSING_QUEUE):
+            for job in self.broker.items(queue_name):
+                if job['job_id'] == job_id:
+                    self.broker.remove(queue_name, job)
+        self.broker.delete(result_queue(job_id))
+
+    def _requeue_orphans(self, job_id, jobs, results, unleased):
+        """
+        Requeue taken shards that have had no live lease for claim_grace seconds
+
+        A shard with no lease that isn't on the processing list is still
+        queued. The grace period covers the moment between a worker taking
+        a job and writing its lease.
+        """
+        now = time.monotonic()
+        for taken in self.broker.items(PROCESSING_QUEUE):
+            if taken['job_id'] != job_id:
+                continue
+            shard_id = taken['shard_id']
+            job = jobs[shard_id]
+
+            # Stale copies (finished shards, superseded attempts) are dropped
+            # once their lease is gone
+            key = lease_key(taken['job_id'], shard_id, taken['attempt'])
+            if self.broker.get(key) is not None:
+                unleased.pop((shard_id, taken['attempt']), None)
+                continue
+            if shard_id in results or taken['attempt'] != job['attempt']:
+                self.broker.remove(PROCESSING_QUEUE, taken)
+                continue
+
+            since = unleased.setdefault((shard_id, taken['attempt']), now)
+            if now - since >= self.claim_grace:
+                print(f"shard {shard_id} lost its worker (attempt {taken['attempt']}); requeueing")
+                self.broker.remove(PROCESSING_QUEUE, taken)
+                self._retry(job)
+
+    def _retry(self, job):
+        if job['attempt'] >= self.max_attempts:
+            raise ShardFailed(f"Shard {job['shard_id']} failed {job['attempt']} time(s)")
+        job['attempt'] += 1
+        self.broker.push(JOB_QUEUE, job)
@@ -0,0 +1,119 @@
+import math
+from models.base_detector import CANDIDATE_ARRAYS, make_candidates
+
+def plan_shards(frame_count, fps, shard_seconds=30.0, warmup_seconds=2.0, sample_rate=None,
+                max_frames=None):
+    """
+    Split a video into time shards
+
+    Each shard also carries a warm-up range before its start, which the
+    worker decodes and runs (so temporal buffers and background models have
+    context) but does not report. The last shard is open-ended, since
+    container frame counts can be short; it reads to the end of the video.
+
+    Each shard also gets a frame buffer limit: the samples its range should
+    hold plus the same headroom the governor's plan allows. The open-ended
+    last shard may use whatever the request's limit leaves after the
+    earlier shards, and a video that can't be split gets the whole limit.
+
+    Args:
+        frame_count: Total frame count (<= 0 if unknown)
+        fps: Frames per second
+        shard_seconds: Shard length in seconds
+        warmup_seconds: Context decoded before each shard
+        sample_rate: Frames kept per second of video (None = every frame)
+        max_frames: The request's frame buffer limit (None = unlimited)
+
+    Returns:
+        list: Shards with keys shard_id, warmup_start, start_frame, end_frame
+            and max_frames
+    """
+    # Without a frame count we can't split, so the whole video is one shard
+    if frame_count <= 0 or fps <= 0:
+        return [{'shard_id': 0, 'warmup_start': 0, 'start_frame': 0, 'end_frame': None,
+                 'max_frames': max_frames}]
+
+    shard_frames = max(1, int(round(shard_seconds * fps)))
+    warmup_frames = int(round(warmup_seconds * fps))
+    samples_per_frame = 1.0 if sample_rate is None else min(1.0, sample_rate / fps)
+
+    def samples(num_frames):
+        return math.ceil(num_frames * samples_per_frame * 1.05) + 1
+
+    starts = list(range(0, frame_count, shard_frames))
+    shards = []
+    for i, start in enumerate(starts):
+        last = i == len(starts) - 1
+        warmup_start = max(0, start - warmup_frames)
+        end_frame = None if last else start + shard_frames
+
+        limit = None
+        if max_frames is not None:
+            limit = min(max_frames, samples((end_frame or frame_count) - warmup_start))
+            if last:
+                # Frames the earlier shards were expected to keep are spent
+                limit = max(limit, max_frames - int(start * samples_per_frame)
+                            + samples(start - warmup_start))
+
+        shards.append({
+            'shard_id': i,
+            'warmup_start': warmup_start,
+            'start_frame': start,
+            'end_frame': end_frame,
+            'max_frames': limit
+        })
+    return shards
+
+def merge_shard_results(shard_results):
+    """
+    Merge per-shard frame results into one list in frame order
+
+    Frames reported by more than one shard (e.g. after a retry) are kept once.
+
+    Args:
+        shard_results: Iterable of lists of frame results (with 'frame_number')
+
+    Returns:
+        list: Frame results sorted by frame_number
+    """
+    frames = {}
+    for results in shard_results:
+        for result in results:
+            frames.setdefault(result['frame_number'], result)
+    return [frames[n] for n in sorted(frames)]
+
+def encode_candidates(candidates, frame_number, timestamp):
+    """
+    Turn a frame's raw candidates into a JSON-serialisable message entry
+
+    float32 scores and boxes survive the round trip through JSON exactly.
+
+    Args:
+        candidates: Candidates dict (see make_candidates), without embedding
+        frame_number: Original frame index
+        timestamp: Presentation time in seconds
+
+    Returns:
+        dict: Candidates with lists for arrays, plus frame_number and timestamp
+    """
+    message = {key: value for key, value in candidates.items() if key not in CANDIDATE_ARRAYS}
+    message.update({
+        'class_ids': candidates['class_ids'].tolist(),
+        'scores': candidates['scores'].tolist(),
+        'boxes': None if candidates['boxes'] is None else candidates['boxes'].tolist(),
+        'frame_number': frame_number,
+        'timestamp': timestamp
+    })
+    return message
+
+def decode_candidates(message):
+    """
+    Inverse of encode_candidates
+
+    Returns:
+        tuple: (candidates dict, frame_number, timestamp)
+    """
+    extras = {key: value for key, value in message.items()
+              if key not in CANDIDATE_ARRAYS and key not in ('frame_number', 'timestamp')}
+    candidates = make_candidates(message['class_ids'], message['scores'], message['boxes'], **extras)
+    return candidates, message['frame_number'], message['timestamp']
@@ -0,0 +1,220 @@
+"""
+Inference worker: pulls video shards from the broker and runs a detector on them
+
+Usage (from backend/, on each inference node):
+    python -m distributed.worker --broker redis://queue-host:6379/0 --threads 1
+
+Workers read videos from the path in each job, so the API front must save
+uploads to storage every worker can see (FUZZYFINDER_SHARED_DIR).
+"""
+import argparse
+import socket
+import threading
+import time
+import traceback
+import uuid
+from models.registry import get_detector
+from models.base_detector import unscale_candidates
+from utils.video_processor import extract_frames
+from distributed.broker import connect_broker
+from distributed.sharding import encode_candidates
+
+JOB_QUEUE = 'fuzzyfinder:jobs'
+
+# Jobs a worker has taken but not finished; they stay here until reported,
+# so a job is never only in a dead worker's memory
+PROCESSING_QUEUE = 'fuzzyfinder:processing'
+
+# Result queues of jobs nobody is collecting any more expire after this
+RESULT_TTL = 24 * 3600
+
+def result_queue(job_id):
+    return f"fuzzyfinder:results:{job_id}"
+
+def closed_key(job_id):
+    """Set once the coordinator stops collecting a job's results"""
+    return f"fuzzyfinder:closed:{job_id}"
+
+def lease_key(job_id, shard_id, attempt):
+    return f"fuzzyfinder:lease:{job_id}:{shard_id}:{attempt}"
+
+class InferenceWorker:
+    """
+    Processes shard jobs from the broker until stopped
+
+    Jobs are taken with an atomic move onto the processing list, and each
+    job is covered by a lease that the job loop itself renews while it
+    makes progress. If the worker dies, hangs or its loop crashes, the
+    lease expires and the coordinator requeues the shard.
+    """
+
+    def __init__(self, broker, worker_id=None, detector_factories=None,
+                 lease_ttl=30.0, poll_timeout=1.0):
+        self.broker = broker
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.detector_factories = detector_factories
+        self.lease_ttl = lease_ttl
+        self.poll_timeout = poll_timeout
+        self._detectors = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lease = None
+        self._lease_renewed = 0.0
+
+    def start(self):
+        """Run the worker loop in a background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop after the current job"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        """Worker loop: take a job, process it, report the result"""
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # Broker hiccups shouldn't kill the worker; an unfinished job's
+                # lease lapses and the coordinator requeues it
+                traceback.print_exc()
+                self._stop.wait(self.poll_timeout)
+
+    def run_once(self):
+        """Take and process at most one job"""
+        job = self.broker.pop_to(JOB_QUEUE, PROCESSING_QUEUE, timeout=self.poll_timeout)
+        if job is None:
+            return
+
+        # The request already finished or failed (its video may be gone)
+        if self.broker.get(closed_key(job['job_id'])) is not None:
+            self.broker.remove(PROCESSING_QUEUE, job)
+            return
+
+        self._lease = lease_key(job['job_id'], job['shard_id'], job['attempt'])
+        self.renew_lease(force=True)
+
+        try:
+            message = self.process_shard(job)
+        except Exception as e:
+            traceback.print_exc()
+            message = {'error': f"{type(e).__name__}: {e}"}
+
+        message.update({
+            'shard_id': job['shard_id'],
+            'attempt': job['attempt'],
+            'worker_id': self.worker_id
+        })
+        # Nobody reads a closed job's results, so don't leave them behind
+        # (the TTL catches a job closed between this check and the push)
+        if self.broker.get(closed_key(job['job_id'])) is None:
+            self.broker.push(result_queue(job['job_id']), message, ttl=RESULT_TTL)
+        self.broker.remove(PROCESSING_QUEUE, job)
+        self.broker.delete(self._lease)
+        self._lease = None
+
+    def renew_lease(self, force=False):
+        """Extend the current job's lease (at most every third of its TTL)"""
+        now = time.monotonic()
+        if self._lease is None or (not force and now - self._lease_renewed < self.lease_ttl / 3):
+            return
+        self.broker.set(self._lease, {'worker_id': self.worker_id}, ttl=self.lease_ttl)
+        self._lease_renewed = now
+
+    def process_shard(self, job):
+        """
+        Run the job's detector over one shard
+
+        The warm-up range before the shard is decoded and run so temporal
+        and motion-gated detectors start the shard with context, but only
+        frames inside the shard are returned.
+
+        Returns:
+            dict: frames (filtered results for the shard, in frame order),
+                candidates (the same frames' raw candidates, see
+                encode_candidates, so the front can re-filter them later) and
+                truncated (the shard hit its frame buffer limit)
+        """
+        detector = self._get_detector(job['detector'])
+        session = detector.create_session()
+
+        video_data = extract_frames(
+            job['video_path'],
+            skip_frames=job['frame_stride'] - 1,
+            scale=job['scale'],
+            start_frame=job['warmup_start'],
+            end_frame=job['end_frame'],
+            target_fps=job.get('target_fps'),
+            max_frames=job.get('max_frames')
+        )
+
+        self.renew_lease()
+
+        candidates_seq = []
+        for frame, frame_number in zip(video_data['frames'], video_data['frame_numbers']):
+            self.renew_lease()
+            # Warm-up frames only have to bring the session's state up to date
+            if frame_number < job['start_frame']:
+                candidates = detector.observe(frame, session)
+            else:
+                candidates = detector.detect_raw(frame, session)
+            candidates = unscale_candidates(candidates, job['scale'])
+            candidates.pop('embedding', None)
+            candidates_seq.append(candidates)
+
+        frame_results = detector.postprocess(candidates_seq, job['threshold'], job['classes'])
+
+        shard_results = []
+        shard_candidates = []
+        for result, candidates, frame_number, timestamp in zip(frame_results, candidates_seq,
+                                                               video_data['frame_numbers'],
+                                                               video_data['timestamps']):
+            if frame_number < job['start_frame']:
+                continue
+            result['frame_number'] = frame_number
+            result['timestamp'] = timestamp
+            shard_results.append(result)
+            shard_candidates.append(encode_candidates(candidates, frame_number, timestamp))
+
+        return {'frames': shard_results, 'candidates': shard_candidates,
+                'truncated': video_data['truncated']}
+
+    def _get_detector(self, detector_type):
+        # Registry detectors are shared process-wide (they are reentrant)
+        if self.detector_factories is None:
+            return get_detector(detector_type)
+
+        if detector_type not in self._detectors:
+            self._detectors[detector_type] = self.detector_factories[detector_type]().ensure_loaded()
+        return self._detectors[detector_type]
+
+def start_local_workers(broker, count=1, **kwargs):
+    """Start in-process workers (for the memory:// broker and tests)"""
+    return [InferenceWorker(broker, **kwargs).start() for _ in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--broker', default='redis://localhost:6379/0')
+    parser.add_argument('--threads', type=int, default=1, help='Worker loops in this process')
+    parser.add_argument('--lease-ttl', type=float, default=30.0,
+                        help='Seconds a job survives without progress before it is requeued')
+    args = parser.parse_args()
+
+    broker = connect_broker(args.broker)
+    workers = start_local_workers(broker, args.threads, lease_ttl=args.lease_ttl)
+    print(f"Started {len(workers)} worker(s): {', '.join(w.worker_id for w in workers)}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.stop()
+
+if __name__ == '__main__':
+    main()
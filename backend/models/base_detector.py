@@ -1,27 +1,255 @@
+import threading
 from abc import ABC, abstractmethod
+import numpy as np
+
+# Guards creating the per-detector load locks
+_LOAD_LOCK = threading.Lock()
+
+# Array fields of a candidates dict; any other key is a per-frame extra
+CANDIDATE_ARRAYS = ('class_ids', 'scores', 'boxes')
+
+def make_candidates(class_ids, scores, boxes=None, **extras):
+    """
+    Pack raw model output into the compact candidates form
+    
+    Args:
+        class_ids: Model class id per candidate
+        scores: Confidence per candidate
+        boxes: Optional (N, 4) boxes in [x1, y1, x2, y2] frame coordinates
+        **extras: Per-frame values passed through to the result (e.g. embedding)
+        
+    Returns:
+        dict: Candidates with int32 class_ids, float32 scores and float32 boxes
+    """
+    candidates = {
+        'class_ids': np.asarray(class_ids, dtype=np.int32).reshape(-1),
+        'scores': np.asarray(scores, dtype=np.float32).reshape(-1),
+        'boxes': None if boxes is None else np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    }
+    candidates.update(extras)
+    return candidates
+
+def unscale_candidates(candidates, scale):
+    """
+    Map candidate boxes from a resized frame back to original-frame pixels
+    
+    Args:
+        candidates: Candidates dict (updated in place)
+        scale: Resize factor the frame was decoded at
+        
+    Returns:
+        dict: The same candidates dict
+    """
+    if scale != 1.0 and candidates['boxes'] is not None:
+        candidates['boxes'] = candidates['boxes'] / np.float32(scale)
+    return candidates
+
+class DetectionSession:
+    """
+    Per-request options and state for a detection run
+    
+    Create one session per video/request and pass it to every detect call.
+    Detectors keep anything that carries over between frames (temporal
+    buffers, background models, ...) in the session rather than on
+    themselves, so one loaded detector can serve concurrent requests.
+    """
+    
+    def __init__(self, confidence_threshold=None, return_embeddings=False):
+        self.confidence_threshold = confidence_threshold
+        self.return_embeddings = return_embeddings
+        self.state = {}
+    
+    def child(self, key, **overrides):
+        """
+        Get (or create) a nested session for a wrapped detector
+        
+        Args:
+            key: Name the child session is stored under
+            **overrides: Options that differ from this session
+        """
+        if key not in self.state:
+            options = {
+                'confidence_threshold': self.confidence_threshold,
+                'return_embeddings': self.return_embeddings
+            }
+            options.update(overrides)
+            self.state[key] = DetectionSession(**options)
+        return self.state[key]
 
 class BaseDetector(ABC):
-    """Base class for all animal detectors"""
+    """
+    Base class for all animal detectors
+    
+    Detectors produce raw candidates (every class scoring above
+    candidate_floor) and thresholding/class filtering happens afterwards in
+    filter_candidates/postprocess, so results can be re-filtered without
+    re-running inference.
+    """
+    
+    # Candidates scoring below this are dropped at inference time
+    candidate_floor = 0.05
+    
+    # Class ids kept when no explicit class filter is given
+    animal_class_ids = ()
+    
+    # Analysed frames a detector must see before a shard's first frame for
+    # its results to match a single pass over the whole video
+    warmup_samples = 0
     
     @abstractmethod
     def load(self):
         """Load the model"""
         pass
-        
+    
+    def ensure_loaded(self):
+        """Load the model if needed; safe to call from several threads"""
+        if getattr(self, 'model', None) is None:
+            # One lock per detector: concurrent first calls load it only once,
+            # without waiting on other detectors' loads
+            with _LOAD_LOCK:
+                load_lock = self.__dict__.setdefault('_load_lock', threading.RLock())
+            with load_lock:
+                if getattr(self, 'model', None) is None:
+                    self.load()
+        return self
+    
+    def create_session(self, **options):
+        """Create a session for one request (see DetectionSession)"""
+        return DetectionSession(**options)
+    
     @abstractmethod
-    def detect(self, frame):
+    def detect_raw_batch(self, frames, session=None):
+        """
+        Run the model and return unfiltered candidates per frame
+        
+        Args:
+            frames: List of CV2 images (BGR format), sizes may differ
+            session: DetectionSession for the current request (optional)
+            
+        Returns:
+            list: One candidates dict (see make_candidates) per frame
+        """
+        pass
+    
+    def detect_raw(self, frame, session=None):
+        """Unfiltered candidates for a single frame (see detect_raw_batch)"""
+        return self.detect_raw_batch([frame], session)[0]
+    
+    def observe(self, frame, session=None):
+        """
+        Feed a frame whose results won't be reported (e.g. a shard's warm-up)
+        
+        Updates whatever per-video state the session carries. By default
+        that means running the model, since wrappers such as the temporal
+        detector replay the raw candidates of earlier frames.
+        
+        Returns:
+            dict: Candidates for the frame (see detect_raw_batch)
+        """
+        return self.detect_raw(frame, session)
+    
+    def detect(self, frame, session=None):
         """
         Detect animals in a single frame
         
         Args:
             frame: CV2 image (BGR format)
-            
+            session: DetectionSession for the current request (optional)
+        
         Returns:
             dict: Detection results with keys:
                 - has_animals (bool): Whether animals were detected
                 - detections (list): List of animal detections
         """
-        pass
+        return self.detect_batch([frame], session)[0]
+    
+    def detect_batch(self, frames, session=None):
+        """
+        Detect animals in several frames at once
+        
+        Args:
+            frames: List of CV2 images (BGR format), sizes may differ
+            session: DetectionSession for the current request (optional)
+        
+        Returns:
+            list: One detection result (see detect) per frame
+        """
+        threshold = self._threshold(session)
+        return [self.filter_candidates(candidates, threshold)
+                for candidates in self.detect_raw_batch(frames, session)]
+    
+    def class_name(self, class_id):
+        """Human-readable name for a model class id"""
+        return f"class_{class_id}"
+    
+    def filter_candidates(self, candidates, confidence_threshold=None, classes=None):
+        """
+        Turn raw candidates into a detection result
+        
+        Args:
+            candidates: Output of detect_raw
+            confidence_threshold: Minimum score (defaults to the detector's)
+            classes: Class names to keep (defaults to the animal classes)
+            
+        Returns:
+            dict: Detection result (see detect)
+        """
+        threshold = self.confidence_threshold if confidence_threshold is None else confidence_threshold
+        class_ids = candidates['class_ids']
+        scores = candidates['scores']
+        boxes = candidates['boxes']
+        
+        if classes is None:
+            keep = np.isin(class_ids, self.animal_class_ids)
+        else:
+            classes = set(classes)
+            keep = np.array([self.class_name(int(c)) in classes for c in class_ids], dtype=bool)
+        keep &= scores > threshold
+        
+        detections = []
+        for i in np.nonzero(keep)[0]:
+            detection = {
+                'class': self.class_name(int(class_ids[i])),
+                'confidence': float(scores[i])
+            }
+            if boxes is not None:
+                detection['bbox'] = boxes[i].tolist()
+            detections.append(detection)
+        
+        result = {
+            'has_animals': bool(detections),
+            'detections': detections
+        }
+        
+        # Pass per-frame extras (embedding, motion_regions, ...) through
+        for key, value in candidates.items():
+            if key not in CANDIDATE_ARRAYS:
+                result[key] = value
+        
+        return result
+    
+    def postprocess(self, candidates_seq, confidence_threshold=None, classes=None):
+        """
+        Filter a whole video's candidates, in frame order
+        
+        Cheap enough to re-run whenever the threshold or class filter changes.
+        
+        Args:
+            candidates_seq: Candidates per frame, in frame order
+            confidence_threshold: Minimum score (defaults to the detector's)
+            classes: Class names to keep (defaults to the animal classes)
+            
+        Returns:
+            list: Detection result per frame
+        """
+        return [self.filter_candidates(candidates, confidence_threshold, classes)
+                for candidates in candidates_seq]
+    
+    def _threshold(self, session):
+        """Confidence threshold for this call: the session's, else the detector's"""
+        if session is not None and session.confidence_threshold is not None:
+            return session.confidence_threshold
+        return self.confidence_threshold
     
     @property
     @abstractmethod
@@ -0,0 +1,138 @@
+import numpy as np
+from .base_detector import BaseDetector, DetectionSession, CANDIDATE_ARRAYS, make_candidates
+from utils.motion_gate import DEFAULT_HISTORY, MotionGate, crop_regions, offset_boxes
+
+class MotionGatedDetector(BaseDetector):
+    """
+    Wraps a base detector so it only sees regions that are moving
+
+    Background subtraction picks out padded crops around motion, the crops
+    are run through the base detector as one batch, and boxes are mapped
+    back to full-frame coordinates. Small animals get a much larger share
+    of the detector's input resolution, and frames with no motion skip
+    inference entirely.
+    """
+
+    def __init__(self, base_detector, warmup_frames=30, full_frame_interval=0, **gate_kwargs):
+        self.base_detector = base_detector
+        self.warmup_frames = warmup_frames
+        self.full_frame_interval = full_frame_interval
+        self.gate_kwargs = gate_kwargs
+        self._name = f"motion_{base_detector.name}"
+
+        # Used by callers that don't pass a session (single-threaded use only)
+        self._default_session = DetectionSession()
+
+    @property
+    def confidence_threshold(self):
+        return self.base_detector.confidence_threshold
+
+    @property
+    def model(self):
+        return getattr(self.base_detector, 'model', None)
+
+    @property
+    def warmup_samples(self):
+        """
+        MOG2 learns from the last `history` frames, so a shard only has the
+        same background model as a single pass after that many
+        """
+        return max(self.warmup_frames, self.gate_kwargs.get('history', DEFAULT_HISTORY),
+                   self.base_detector.warmup_samples)
+
+    def load(self):
+        """Load the base detector"""
+        self.base_detector.ensure_loaded()
+        return self
+
+    def detect_raw_batch(self, frames, session=None):
+        """Frames are processed in order, since each one updates the background model"""
+        return [self.detect_raw(frame, session) for frame in frames]
+
+    def detect_raw(self, frame, session=None):
+        """Candidates from the moving regions of a frame, in full-frame coordinates"""
+        if session is None:
+            session = self._default_session
+        gate = self._gate(session)
+        base_session = session.child('base')
+
+        regions = gate.regions(frame)
+
+        # Until the background is learned (and periodically, if configured,
+        # to catch animals that stopped moving) look at the whole frame
+        frames_seen = gate.frames_seen
+        if frames_seen <= self.warmup_frames or (
+                self.full_frame_interval and frames_seen % self.full_frame_interval == 0):
+            candidates = self.base_detector.detect_raw(frame, base_session)
+            candidates.pop('embedding', None)
+            candidates['motion_regions'] = len(regions)
+            candidates['region_candidates'] = [len(candidates['class_ids'])]
+            return candidates
+
+        if not regions:
+            return make_candidates([], [], np.zeros((0, 4)), motion_regions=0, region_candidates=[])
+
+        crop_candidates = self.base_detector.detect_raw_batch(crop_regions(frame, regions), base_session)
+
+        # Crop embeddings aren't comparable across frames, so none are returned
+        return make_candidates(
+            np.concatenate([c['class_ids'] for c in crop_candidates]),
+            np.concatenate([c['scores'] for c in crop_candidates]),
+            np.concatenate([offset_boxes(c['boxes'], len(c['class_ids']), region)
+                            for c, region in zip(crop_candidates, regions)]),
+            motion_regions=len(regions),
+            region_candidates=[len(c['class_ids']) for c in crop_candidates]
+        )
+
+    def observe(self, frame, session=None):
+        """Update the background model only; the frame's results aren't needed"""
+        if self.base_detector.warmup_samples:
+            # A stateful base detector has to see its crops too
+            return self.detect_raw(frame, session)
+        self._gate(session or self._default_session).regions(frame)
+        return make_candidates([], [], np.zeros((0, 4)), motion_regions=0, region_candidates=[])
+
+    def _gate(self, session):
+        # The background model is per video, so it lives in the session
+        if 'motion_gate' not in session.state:
+            session.state['motion_gate'] = MotionGate(**self.gate_kwargs)
+        return session.state['motion_gate']
+
+    def filter_candidates(self, candidates, confidence_threshold=None, classes=None):
+        """
+        Turn raw candidates into a detection result
+
+        Each crop (or the whole frame, during warm-up) is filtered by the
+        base detector's own rules, so e.g. a classifier still gives one
+        answer per crop rather than several classes for the same region.
+        """
+        bounds = np.cumsum(candidates['region_candidates'])[:-1]
+        boxes = candidates['boxes']
+        box_groups = [None] * (len(bounds) + 1) if boxes is None else np.split(boxes, bounds)
+
+        detections = []
+        for class_ids, scores, group_boxes in zip(np.split(candidates['class_ids'], bounds),
+                                                  np.split(candidates['scores'], bounds), box_groups):
+            region_result = self.base_detector.filter_candidates(
+                make_candidates(class_ids, scores, group_boxes), confidence_threshold, classes)
+            detections.extend(region_result['detections'])
+
+        result = {
+            'has_animals': bool(detections),
+            'detections': detections
+        }
+        for key, value in candidates.items():
+            if key not in CANDIDATE_ARRAYS and key != 'region_candidates':
+                result[key] = value
+        return result
+
+    def class_name(self, class_id):
+        return self.base_detector.class_name(class_id)
+
+    @property
+    def animal_class_ids(self):
+        return self.base_detector.animal_class_ids
+
+    @property
+    def name(self):
+        return self._name
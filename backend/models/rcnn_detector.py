@@ -1,4 +1,4 @@
-from models.base_detector import BaseDetector
+from models.base_detector import BaseDetector, make_candidates
 import torch
 import torchvision
 from torchvision.models.detection import fasterrcnn_resnet50_fpn_v2
@@ -29,47 +29,41 @@ class FasterRCNNDetector(BaseDetector):
     def load(self):
         """Load the Faster R-CNN model"""
         # Load a pre-trained Faster R-CNN model
-        self.model = fasterrcnn_resnet50_fpn_v2(weights='DEFAULT')
-        self.model.eval()
+        model = fasterrcnn_resnet50_fpn_v2(weights='DEFAULT')
+        model.eval()
+        self.model = model
         return self
     
-    def detect(self, frame):
-        """Detect animals in a frame using Faster R-CNN"""
-        if self.model is None:
-            self.load()
+    def detect_raw_batch(self, frames, session=None):
+        """Run Faster R-CNN on a batch of frames and keep every candidate above the floor"""
+        self.ensure_loaded()
         
-        # Convert BGR to RGB (OpenCV uses BGR, PyTorch uses RGB)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Convert to tensor
-        img_tensor = torch.from_numpy(frame_rgb).permute(2, 0, 1).float() / 255.0
+        img_tensors = []
+        for frame in frames:
+            # Convert BGR to RGB (OpenCV uses BGR, PyTorch uses RGB)
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            
+            # Convert to tensor
+            img_tensors.append(torch.from_numpy(frame_rgb).permute(2, 0, 1).float() / 255.0)
         
         # Run inference
         with torch.no_grad():
-            prediction = self.model([img_tensor])
+            predictions = self.model(img_tensors)
         
+        return [self._to_candidates(prediction) for prediction in predictions]
+    
+    def _to_candidates(self, prediction):
+        """Turn one raw model prediction into compact candidates"""
         # Extract predictions
-        boxes = prediction[0]['boxes'].cpu().numpy()
-        labels = prediction[0]['labels'].cpu().numpy()
-        scores = prediction[0]['scores'].cpu().numpy()
-        
-        # Filter for animals with confidence above threshold
-        animal_detections = []
-        has_animals = False
+        boxes = prediction['boxes'].cpu().numpy()
+        labels = prediction['labels'].cpu().numpy()
+        scores = prediction['scores'].cpu().numpy()
         
-        for box, label, score in zip(boxes, labels, scores):
-            if label in self.animal_class_ids and score > self.confidence_threshold:
-                has_animals = True
-                animal_detections.append({
-                    'class': self.class_names.get(label.item(), f"class_{label.item()}"),
-                    'confidence': score.item(),
-                    'bbox': box.tolist()
-                })
-        
-        return {
-            'has_animals': has_animals,
-            'detections': animal_detections
-        }
+        keep = scores >= self.candidate_floor
+        return make_candidates(labels[keep], scores[keep], boxes[keep])
+    
+    def class_name(self, class_id):
+        return self.class_names.get(class_id, f"class_{class_id}")
     
     @property
     def name(self):
@@ -0,0 +1,65 @@
+import threading
+from models.resnet_detector import ResNetDetector
+from models.yolo_detector import YOLODetector
+from models.temporal_detector import TemporalDetector
+from models.rcnn_detector import FasterRCNNDetector
+from models.ssd_detector import SSDDetector
+from models.mobilenet_detector import MobileNetDetector
+from models.motion_gated_detector import MotionGatedDetector
+
+# Available detector factory
+DETECTORS = {
+    'resnet': lambda: ResNetDetector(confidence_threshold=0.3),
+    'yolo': lambda: YOLODetector(confidence_threshold=0.3),
+    'faster_rcnn': lambda: FasterRCNNDetector(confidence_threshold=0.4),
+    'ssd': lambda: SSDDetector(confidence_threshold=0.4),
+    'mobilenet': lambda: MobileNetDetector(confidence_threshold=0.4),
+    'temporal_mobilenet': lambda: TemporalDetector(MobileNetDetector(confidence_threshold=0.4), sequence_length=5),
+    'temporal_resnet': lambda: TemporalDetector(ResNetDetector(confidence_threshold=0.3), sequence_length=5),
+    'temporal_yolo': lambda: TemporalDetector(YOLODetector(confidence_threshold=0.4), sequence_length=5),
+    'temporal_faster_rcnn': lambda: TemporalDetector(FasterRCNNDetector(confidence_threshold=0.4), sequence_length=5),
+    'temporal_ssd': lambda: TemporalDetector(SSDDetector(confidence_threshold=0.4), sequence_length=5),
+    'motion_mobilenet': lambda: MotionGatedDetector(MobileNetDetector(confidence_threshold=0.4)),
+    'motion_resnet': lambda: MotionGatedDetector(ResNetDetector(confidence_threshold=0.3)),
+    'motion_yolo': lambda: MotionGatedDetector(YOLODetector(confidence_threshold=0.4)),
+}
+
+# Default analysis rate per detector type, in frames per second of video
+# (None = every frame). Per-frame detectors gain nothing from more than a
+# few frames a second; temporal and motion-gated detectors carry state
+# between frames, so they sample more densely. Requests can override this.
+DEFAULT_ANALYSIS_FPS = 5.0
+ANALYSIS_FPS = {
+    'temporal_mobilenet': 10.0,
+    'temporal_resnet': 10.0,
+    'temporal_yolo': 10.0,
+    'temporal_faster_rcnn': 10.0,
+    'temporal_ssd': 10.0,
+    'motion_mobilenet': 10.0,
+    'motion_resnet': 10.0,
+    'motion_yolo': 10.0,
+}
+
+def analysis_fps(detector_type):
+    """Default analysis rate for a detector type (see ANALYSIS_FPS)"""
+    return ANALYSIS_FPS.get(detector_type, DEFAULT_ANALYSIS_FPS)
+
+def warmup_samples(detector_type):
+    """Analysed frames a shard must replay before its start (see BaseDetector.warmup_samples)"""
+    # A fresh instance is enough: the attribute doesn't need the model loaded
+    return DETECTORS[detector_type]().warmup_samples
+
+# Loaded detectors shared by all requests (per-request state lives in sessions)
+_LOADED_DETECTORS = {}
+_LOADED_DETECTORS_LOCK = threading.Lock()
+
+def get_detector(detector_type):
+    """Return the shared, loaded detector for a type, loading it on first use"""
+    with _LOADED_DETECTORS_LOCK:
+        if detector_type not in _LOADED_DETECTORS:
+            _LOADED_DETECTORS[detector_type] = DETECTORS[detector_type]()
+        detector = _LOADED_DETECTORS[detector_type]
+    
+    # Loaded outside the registry lock, so a slow first load (e.g. a weights
+    # download) only holds up requests for the same type
+    return detector.ensure_loaded()
@@ -1,19 +1,23 @@
 import torch
+import torch.nn as nn
 import torchvision.models as models
 import torchvision.transforms as transforms
 from PIL import Image
 import cv2
 import numpy as np
-from .base_detector import BaseDetector
+from .base_detector import BaseDetector, make_candidates
 
 class ResNetDetector(BaseDetector):
     """Animal detector using ResNet50 pre-trained on ImageNet"""
     
-    def __init__(self, confidence_threshold=0.5):
+    def __init__(self, confidence_threshold=0.5, return_embeddings=False):
         self.model = None
+        self.feature_extractor = None
         self.transform = None
-        self.confidence_threshold = 0.3 #confidence_threshold
+        self.return_embeddings = return_embeddings
+        self.confidence_threshold = confidence_threshold
         self.imagenet_labels = None
+        self._animal_class_ids = None
         self._name = "resnet50"
         
         # Animal classes in ImageNet
@@ -25,8 +29,13 @@ class ResNetDetector(BaseDetector):
     def load(self):
         """Load the ResNet model and prepare transforms"""
         # Load pre-trained model
-        self.model = models.resnet50(pretrained=True)
-        self.model.eval()
+        model = models.resnet50(pretrained=True)
+        model.eval()
+        
+        # Everything up to (and including) global average pooling, so the
+        # penultimate features and the logits come from a single forward pass
+        self.feature_extractor = nn.Sequential(*list(model.children())[:-1])
+        self.feature_extractor.eval()
         
         # Load ImageNet labels
         try:
@@ -45,46 +54,92 @@ class ResNetDetector(BaseDetector):
                                std=[0.229, 0.224, 0.225])
         ])
         
+        # Assigned last: other threads treat a non-None model as fully loaded
+        self.model = model
+        
         return self
     
-    def detect(self, frame):
-        """Detect animals in a frame using ResNet50"""
-        if self.model is None:
-            self.load()
+    def detect_raw_batch(self, frames, session=None):
+        """
+        Classify a batch of frames (or crops) using ResNet50
         
-        # Convert from BGR to RGB (OpenCV uses BGR, PIL uses RGB)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        Every class clearing the floor is kept as a candidate, so a class
+        filter can still find e.g. 'dog' where it ranked below 'cat'; see
+        filter_candidates for how one answer is picked per image.
+        """
+        self.ensure_loaded()
+        return_embeddings = session.return_embeddings if session is not None else self.return_embeddings
         
-        # Convert to PIL Image
-        pil_image = Image.fromarray(frame_rgb)
+        img_tensors = []
+        for frame in frames:
+            # Convert from BGR to RGB (OpenCV uses BGR, PIL uses RGB)
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            
+            # Convert to PIL Image and apply transformation
+            img_tensors.append(self.transform(Image.fromarray(frame_rgb)))
         
-        # Apply transformation
-        img_tensor = self.transform(pil_image)
-        img_tensor = img_tensor.unsqueeze(0)  # Add batch dimension
+        # Transforms give every image the same size, so they stack into one batch
+        batch = torch.stack(img_tensors)
         
         # Get prediction
         with torch.no_grad():
-            output = self.model(img_tensor)
+            features = torch.flatten(self.feature_extractor(batch), 1)
+            output = self.model.fc(features)
+            probabilities = torch.softmax(output, dim=1)
             
-        # Get top prediction
-        _, predicted_idx = torch.max(output, 1)
-        predicted_idx = predicted_idx.item()
+        # Softmax scores sum to 1, so at most 1 / candidate_floor classes
+        # clear the floor per image
+        probabilities = probabilities.numpy()
         
-        predicted_label = self.imagenet_labels[predicted_idx]
-        is_animal = self._is_animal(predicted_label)
+        results = []
+        for i in range(len(frames)):
+            class_ids = np.nonzero(probabilities[i] >= self.candidate_floor)[0]
+            class_ids = class_ids[np.argsort(-probabilities[i, class_ids], kind='stable')]
+            extras = {}
+            if return_embeddings:
+                extras['embedding'] = self._compact_embedding(features[i])
+            results.append(make_candidates(class_ids, probabilities[i, class_ids], **extras))
         
-        # Create detection entry if it's an animal
-        detections = []
-        if is_animal:
-            detections.append({
-                'class': predicted_label,
-                'confidence': float(torch.softmax(output, dim=1)[0, predicted_idx].item())
-            })
+        return results
+    
+    def filter_candidates(self, candidates, confidence_threshold=None, classes=None):
+        """
+        Turn raw candidates into a detection result
         
-        return {
-            'has_animals': is_animal,
-            'detections': detections
-        }
+        A classifier has one answer per image. Without a class filter that
+        is the top class, reported only if it is an animal above the
+        threshold; with one, it is the highest-scoring class that passes
+        the filter, if any.
+        """
+        if classes is None and len(candidates['scores']) > 1:
+            top = int(np.argmax(candidates['scores']))
+            candidates = dict(candidates,
+                              class_ids=candidates['class_ids'][top:top + 1],
+                              scores=candidates['scores'][top:top + 1])
+        result = super().filter_candidates(candidates, confidence_threshold, classes)
+        if len(result['detections']) > 1:
+            result['detections'] = [max(result['detections'], key=lambda d: d['confidence'])]
+        return result
+    
+    def class_name(self, class_id):
+        return self.imagenet_labels[class_id]
+    
+    @property
+    def animal_class_ids(self):
+        """ImageNet indices whose label matches an animal term"""
+        if self._animal_class_ids is None and self.imagenet_labels is not None:
+            self._animal_class_ids = [
+                i for i, label in enumerate(self.imagenet_labels) if self._is_animal(label)
+            ]
+        return self._animal_class_ids or []
+    
+    def _compact_embedding(self, features):
+        """L2-normalise the 2048-d pooled features and store them as float16"""
+        embedding = features.cpu().numpy().astype(np.float32)
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding /= norm
+        return embedding.astype(np.float16)
     
     # def _is_animal(self, label):
     #     """Check if the label is an animal"""
@@ -2,7 +2,7 @@ import torch
 import torchvision
 from torchvision.models.detection import ssd300_vgg16
 import cv2
-from .base_detector import BaseDetector
+from .base_detector import BaseDetector, make_candidates
 
 class SSDDetector(BaseDetector):
     """Animal detector using SSD300 from torchvision"""
@@ -25,47 +25,45 @@ class SSDDetector(BaseDetector):
     def load(self):
         """Load the SSD model"""
         # Load pre-trained model
-        self.model = ssd300_vgg16(pretrained=True)
-        self.model.eval()
+        model = ssd300_vgg16(pretrained=True)
+        model.eval()
+        self.model = model
         return self
     
-    def detect(self, frame):
-        """Detect animals in a frame using SSD"""
-        if self.model is None:
-            self.load()
+    def detect_raw_batch(self, frames, session=None):
+        """Run SSD on a batch of frames and keep every candidate above the floor"""
+        self.ensure_loaded()
         
-        # Convert BGR to RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Convert to tensor
-        img_tensor = torch.from_numpy(frame_rgb).permute(2, 0, 1).float() / 255.0
+        img_tensors = []
+        for frame in frames:
+            # Convert BGR to RGB
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            
+            # Convert to tensor
+            img_tensors.append(torch.from_numpy(frame_rgb).permute(2, 0, 1).float() / 255.0)
         
         # Run inference
         with torch.no_grad():
-            prediction = self.model([img_tensor])
+            predictions = self.model(img_tensors)
         
+        return [self._to_candidates(prediction) for prediction in predictions]
+    
+    def _to_candidates(self, prediction):
+        """Turn one raw model prediction into compact candidates"""
         # Extract predictions
-        boxes = prediction[0]['boxes'].cpu()
-        labels = prediction[0]['labels'].cpu()
-        scores = prediction[0]['scores'].cpu()
-        
-        # Filter for animals with confidence above threshold
-        animal_detections = []
-        has_animals = False
-        
-        for box, label, score in zip(boxes, labels, scores):
-            if label.item() in self.animal_classes and score.item() > self.confidence_threshold:
-                has_animals = True
-                animal_detections.append({
-                    'class': self.coco_classes.get(label.item(), f"class_{label.item()}"),
-                    'confidence': float(score.item()),
-                    'bbox': box.tolist()
-                })
+        boxes = prediction['boxes'].cpu().numpy()
+        labels = prediction['labels'].cpu().numpy()
+        scores = prediction['scores'].cpu().numpy()
         
-        return {
-            'has_animals': has_animals,
-            'detections': animal_detections
-        }
+        keep = scores >= self.candidate_floor
+        return make_candidates(labels[keep], scores[keep], boxes[keep])
+    
+    def class_name(self, class_id):
+        return self.coco_classes.get(class_id, f"class_{class_id}")
+    
+    @property
+    def animal_class_ids(self):
+        return self.animal_classes
     
     @property
     def name(self):
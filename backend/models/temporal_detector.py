@@ -1,82 +1,156 @@
+import zlib
 import torch
 import torch.nn as nn
 import numpy as np
 import cv2
 from torchvision import transforms
-from .base_detector import BaseDetector
+from .base_detector import BaseDetector, DetectionSession
 
 class TemporalDetector(BaseDetector):
     """
     Temporal detector that wraps a base detector and adds LSTM-based
     temporal processing to improve detection consistency
+    
+    The LSTM is initialised from a fixed seed with its own generator, so
+    every process or thread (e.g. each distributed worker) builds the same
+    temporal model.
     """
     
-    def __init__(self, base_detector, sequence_length=5, hidden_size=128, num_layers=2):
+    def __init__(self, base_detector, sequence_length=5, hidden_size=128, num_layers=2,
+                 confidence_threshold=0.3, base_threshold=0.3, seed=0):
         self.base_detector = base_detector
         self.sequence_length = sequence_length
-        self.frame_buffer = []
-        self.detection_buffer = []  # Store detection results directly
+        self.confidence_threshold = confidence_threshold  # Applied to the temporal score
+        self.base_threshold = base_threshold  # Lower threshold for base detections
         self.lstm = None
         self.fc = None
         self.sigmoid = None
         self.hidden_size = hidden_size
         self.num_layers = num_layers
+        self.seed = seed
         self._name = f"temporal_{base_detector.name}"
-        self.class_mapping = {}  # To map class names to indices
-        self.next_class_id = 0  # Counter for assigning class IDs
+        
+        # Used by callers that don't pass a session (single-threaded use only)
+        self._default_session = DetectionSession()
+    
+    @property
+    def model(self):
+        return self.lstm
+    
+    @property
+    def warmup_samples(self):
+        """The frames before a shard that fill its first sequence"""
+        return self.sequence_length - 1 + self.base_detector.warmup_samples
+    
+    def create_session(self, **options):
+        """Create a session holding the per-video buffers and class mapping"""
+        session = DetectionSession(**options)
+        self._init_session_state(session)
+        return session
+    
+    def _init_session_state(self, session):
+        session.state['detection_buffer'] = []  # Store detection results directly
+        session.state['class_mapping'] = {}  # Cache of class name -> feature index
         
     def load(self):
         """Load base detector and LSTM model"""
         # Ensure base detector is loaded
-        if getattr(self.base_detector, 'model', None) is None:
-            self.base_detector.load()
+        self.base_detector.ensure_loaded()
         
         # Fixed feature size for all models to simplify
         feature_size = 128
         
         # Create LSTM components explicitly instead of Sequential
-        self.lstm = nn.LSTM(
+        lstm = nn.LSTM(
             input_size=feature_size,
             hidden_size=self.hidden_size,
             num_layers=self.num_layers,
             batch_first=True
         )
-        
         self.fc = nn.Linear(self.hidden_size, 1)
+        
+        # Re-initialise from a private generator, so the weights depend only
+        # on the seed even while other threads use (or seed) the global RNG.
+        # PyTorch's default ranges: 1/sqrt(hidden_size) for the LSTM and
+        # 1/sqrt(fan_in) for the head, which are the same here
+        generator = torch.Generator().manual_seed(self.seed)
+        bound = 1.0 / np.sqrt(self.hidden_size)
+        with torch.no_grad():
+            for param in list(lstm.parameters()) + list(self.fc.parameters()):
+                param.uniform_(-bound, bound, generator=generator)
+        
         self.sigmoid = nn.Sigmoid()
         
         # Set to evaluation mode
-        self.lstm.eval()
+        lstm.eval()
         self.fc.eval()
         
+        # Assigned last: other threads treat a non-None model as fully loaded
+        self.lstm = lstm
+        
         return self
     
-    def detect(self, frame):
+    def detect_raw_batch(self, frames, session=None):
+        """Raw candidates come straight from the base detector"""
+        base_session = (session or self._default_session).child('base')
+        return self.base_detector.detect_raw_batch(frames, base_session)
+    
+    def detect(self, frame, session=None):
         """
         Process frame with temporal context
         """
+        self.ensure_loaded()
+        if session is None:
+            session = self._default_session
+        
         # Get base detection result with lower threshold for better recall
-        original_threshold = self.base_detector.confidence_threshold
-        self.base_detector.confidence_threshold = 0.3  # Lower threshold for detection
-        base_result = self.base_detector.detect(frame)
-        self.base_detector.confidence_threshold = original_threshold  # Restore original
+        candidates = self.detect_raw(frame, session)
+        base_result = self.base_detector.filter_candidates(candidates, self.base_threshold)
+        return self._temporal_step(base_result, session)
+    
+    def detect_batch(self, frames, session=None):
+        """Frames are processed in order, since each one extends the sequence"""
+        return [self.detect(frame, session) for frame in frames]
+    
+    def postprocess(self, candidates_seq, confidence_threshold=None, classes=None):
+        """Replay the temporal model over cached candidates (no base inference)"""
+        self.ensure_loaded()
+        session = self.create_session(confidence_threshold=confidence_threshold)
+        return [
+            self._temporal_step(
+                self.base_detector.filter_candidates(candidates, self.base_threshold, classes),
+                session
+            )
+            for candidates in candidates_seq
+        ]
+    
+    def class_name(self, class_id):
+        return self.base_detector.class_name(class_id)
+    
+    @property
+    def animal_class_ids(self):
+        return self.base_detector.animal_class_ids
+    
+    def _temporal_step(self, base_result, session):
+        """Push one base result into the session's sequence and score it"""
+        if 'detection_buffer' not in session.state:
+            self._init_session_state(session)
+        detection_buffer = session.state['detection_buffer']
         
-        # Add to buffers
-        self.frame_buffer.append(frame)
-        self.detection_buffer.append(base_result)
+        # Add to buffer
+        detection_buffer.append(base_result)
         
         # Keep only the last sequence_length frames
-        if len(self.frame_buffer) > self.sequence_length:
-            self.frame_buffer.pop(0)
-            self.detection_buffer.pop(0)
+        if len(detection_buffer) > self.sequence_length:
+            detection_buffer.pop(0)
         
         # If we don't have enough frames yet, return base result
-        if len(self.frame_buffer) < self.sequence_length:
+        if len(detection_buffer) < self.sequence_length:
             return base_result
         
         # Check if any frame in sequence has animals
         # This is a simple fallback mechanism
-        any_animals = any(result['has_animals'] for result in self.detection_buffer)
+        any_animals = any(result['has_animals'] for result in detection_buffer)
         
         if not any_animals:
             # No animals detected in any frame, skip LSTM
@@ -86,7 +160,7 @@ class TemporalDetector(BaseDetector):
             return result
             
         # Extract features from detection results
-        features = self._extract_sequence_features()
+        features = self._extract_sequence_features(detection_buffer, session.state)
         
         # Process with LSTM
         try:
@@ -102,7 +176,7 @@ class TemporalDetector(BaseDetector):
                 result['temporal_confidence'] = temporal_score
                 
                 # Lower threshold for temporal decision
-                result['has_animals'] = temporal_score > 0.3
+                result['has_animals'] = temporal_score > self._threshold(session)
                 
                 return result
         except Exception as e:
@@ -110,8 +184,14 @@ class TemporalDetector(BaseDetector):
             # Return base result as fallback
             return base_result
     
-    def _extract_sequence_features(self):
-        """Extract features from detection results"""
+    def _extract_sequence_features(self, detection_buffer, state):
+        """
+        Extract features from detection results
+        
+        Args:
+            detection_buffer: Base detection results for the sequence
+            state: Session state holding the class mapping (updated in place)
+        """
         # Fixed feature size
         feature_size = 128
         
@@ -119,7 +199,8 @@ class TemporalDetector(BaseDetector):
         features_array = np.zeros((self.sequence_length, feature_size), dtype=np.float32)
         
         # Process each frame's detection results
-        for i, result in enumerate(self.detection_buffer):
+        class_mapping = state['class_mapping']
+        for i, result in enumerate(detection_buffer):
             # Feature 0: Has animals overall flag
             features_array[i, 0] = 1.0 if result['has_animals'] else 0.0
             
@@ -135,17 +216,14 @@ class TemporalDetector(BaseDetector):
                 if 'class' in detection:
                     class_name = detection['class']
                     
-                    # Map class name to index if not already mapped
-                    if class_name not in self.class_mapping:
-                        if self.next_class_id < feature_size - 20:  # Reserve space
-                            self.class_mapping[class_name] = self.next_class_id + 20
-                            self.next_class_id += 1
-                        else:
-                            # If we run out of space, use a hash
-                            self.class_mapping[class_name] = hash(class_name) % (feature_size - 20) + 20
+                    # Map class name to index if not already mapped. The index
+                    # depends only on the name (crc32 is stable across processes,
+                    # unlike hash), so shards of a video agree on it
+                    if class_name not in class_mapping:
+                        class_mapping[class_name] = zlib.crc32(class_name.encode()) % (feature_size - 20) + 20
                     
                     # Set feature for this class
-                    class_idx = self.class_mapping[class_name]
+                    class_idx = class_mapping[class_name]
                     features_array[i, class_idx] = detection['confidence']
                 
                 # If we have bbox info, encode it as features
@@ -1,7 +1,8 @@
+import threading
 import torch
 import cv2
 import numpy as np
-from .base_detector import BaseDetector
+from .base_detector import BaseDetector, make_candidates
 
 class YOLODetector(BaseDetector):
     """Animal detector using YOLOv8"""
@@ -10,6 +11,10 @@ class YOLODetector(BaseDetector):
         self.model = None
         self.confidence_threshold = confidence_threshold
         self._name = "yolov8"
+        self._animal_class_ids = None
+        
+        # The ultralytics predictor keeps per-call state, so calls are serialised
+        self._predict_lock = threading.Lock()
         
         # COCO dataset animal classes
         self.animal_classes = [
@@ -28,44 +33,34 @@ class YOLODetector(BaseDetector):
         
         return self
     
-    def detect(self, frame):
-        """Detect animals in a frame using YOLOv8"""
-        if self.model is None:
-            self.load()
-        
-        # Process frame with YOLOv8
-        results = self.model(frame)
+    def detect_raw_batch(self, frames, session=None):
+        """Run YOLOv8 on a batch of frames and keep every candidate above the floor"""
+        self.ensure_loaded()
         
-        # Filter for animals
-        animal_detections = []
-        animals_found = False
+        # Process frames with YOLOv8 (one result per image)
+        with self._predict_lock:
+            results = self.model(list(frames), conf=self.candidate_floor)
         
-        # Process first result (single image)
-        for r in results:
-            # Extract boxes, confidences and class ids
-            boxes = r.boxes
-            
-            for box in boxes:
-                cls_id = int(box.cls[0].item())
-                cls_name = r.names[cls_id]
-                conf = float(box.conf[0].item())
-                
-                if cls_name in self.animal_classes and conf > self.confidence_threshold:
-                    animals_found = True
-                    
-                    # Get bounding box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    
-                    animal_detections.append({
-                        'class': cls_name,
-                        'confidence': conf,
-                        'bbox': [x1, y1, x2, y2]
-                    })
-        
-        return {
-            'has_animals': animals_found,
-            'detections': animal_detections
-        }
+        return [self._to_candidates(r) for r in results]
+    
+    def _to_candidates(self, r):
+        """Turn one YOLOv8 result into compact candidates"""
+        # Extract boxes, confidences and class ids for all boxes at once
+        return make_candidates(
+            r.boxes.cls.cpu().numpy(),
+            r.boxes.conf.cpu().numpy(),
+            r.boxes.xyxy.cpu().numpy()
+        )
+    
+    def class_name(self, class_id):
+        return self.model.names[class_id]
+    
+    @property
+    def animal_class_ids(self):
+        """COCO ids of the animal classes, looked up from the model's names"""
+        if self._animal_class_ids is None:
+            self._animal_class_ids = [i for i, name in self.model.names.items() if name in self.animal_classes]
+        return self._animal_class_ids
     
     @property
     def name(self):
@@ -2,44 +2,75 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import tempfile
 import os
+import math
 import cv2
 import numpy as np
 
 # Import our modules
-from models.resnet_detector import ResNetDetector
-from models.yolo_detector import YOLODetector
-from models.temporal_detector import TemporalDetector
-from models.rcnn_detector import FasterRCNNDetector
-from models.ssd_detector import SSDDetector
-from models.mobilenet_detector import MobileNetDetector
+from models.registry import DETECTORS, get_detector, analysis_fps, warmup_samples
+from models.base_detector import unscale_candidates
 from utils.video_processor import extract_frames, find_animal_segments
+from utils.embedding_store import EmbeddingStore, video_fingerprint, find_near_duplicates
+from utils.resource_governor import ResourceGovernor, RequestTooLarge, AdmissionTimeout, probe_video
+from utils.result_cache import ResultCache
+from distributed.broker import connect_broker
+from distributed.coordinator import Coordinator, ShardFailed
+from distributed.sharding import decode_candidates
+from distributed.worker import start_local_workers
 
 app = Flask(__name__)
 CORS(app)
 
+# Reject oversized uploads before they hit the disk
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('FUZZYFINDER_MAX_UPLOAD_MB', 1024)) * 1024 ** 2
+
+# Shared memory budget that every request is admitted against
+GOVERNOR = ResourceGovernor(
+    memory_budget=int(os.environ.get('FUZZYFINDER_MEMORY_BUDGET_MB', 4096)) * 1024 ** 2,
+    per_request_limit=int(os.environ.get('FUZZYFINDER_REQUEST_LIMIT_MB', 2048)) * 1024 ** 2
+)
+
+# Frame embeddings kept across runs for dedup and similarity search
+EMBEDDINGS = EmbeddingStore(os.environ.get('FUZZYFINDER_EMBEDDINGS_DIR', 'embeddings'))
+
+# Raw candidates of recently processed videos, keyed by (video_id, detector type)
+CANDIDATES = ResultCache(max_entries=int(os.environ.get('FUZZYFINDER_CACHED_VIDEOS', 32)))
+
+# Distributed mode: this process only shards videos and merges results;
+# inference runs on workers (python -m distributed.worker) fed via the broker
+DISTRIBUTED = os.environ.get('FUZZYFINDER_MODE', 'local') == 'distributed'
+SHARED_DIR = os.environ.get('FUZZYFINDER_SHARED_DIR') or None
+COORDINATOR = None
+if DISTRIBUTED:
+    broker = connect_broker(os.environ.get('FUZZYFINDER_BROKER_URL', 'memory://'))
+    COORDINATOR = Coordinator(broker, shard_seconds=float(os.environ.get('FUZZYFINDER_SHARD_SECONDS', 30)))
+    
+    # The in-process broker can't reach other nodes, so run workers here
+    if os.environ.get('FUZZYFINDER_BROKER_URL', 'memory://').startswith('memory://'):
+        start_local_workers(broker, int(os.environ.get('FUZZYFINDER_LOCAL_WORKERS', 2)))
+
 ''' Test route '''
 @app.route('/', methods=['GET'])
 def hello_world():
     response = jsonify({'message': 'Hello, World!'})
     return response
 
-# Available detector factory
-DETECTORS = {
-    'resnet': lambda: ResNetDetector(confidence_threshold=0.3),
-    'yolo': lambda: YOLODetector(confidence_threshold=0.3),
-    'faster_rcnn': lambda: FasterRCNNDetector(confidence_threshold=0.4),
-    'ssd': lambda: SSDDetector(confidence_threshold=0.4),
-    'mobilenet': lambda: MobileNetDetector(confidence_threshold=0.4),
-    'temporal_mobilenet': lambda: TemporalDetector(MobileNetDetector(confidence_threshold=0.4), sequence_length=5),
-    'temporal_resnet': lambda: TemporalDetector(ResNetDetector(confidence_threshold=0.3), sequence_length=5),
-    'temporal_yolo': lambda: TemporalDetector(YOLODetector(confidence_threshold=0.4), sequence_length=5),
-    'temporal_faster_rcnn': lambda: TemporalDetector(FasterRCNNDetector(confidence_threshold=0.4), sequence_length=5),
-    'temporal_ssd': lambda: TemporalDetector(SSDDetector(confidence_threshold=0.4), sequence_length=5),
-}
-
 @app.route('/process-video', methods=['POST'])
 def process_video():
-    """Process video and detect animals in frames"""
+    """
+    Process video and detect animals in frames
+    
+    Form fields besides the video: detector, threshold, classes,
+    analysis_fps, store_embeddings and skip_duplicates.
+    
+    skip_duplicates only has an effect when the same upload (identical
+    bytes, matched by fingerprint) was processed before with
+    store_embeddings=true: frames that were near-duplicates of the last
+    distinct frame in that run reuse the previous frame's candidates
+    (marked 'duplicate') instead of running inference. On a first run,
+    or for frames the earlier run didn't analyse (e.g. at another
+    analysis_fps), every frame is processed.
+    """
     if 'video' not in request.files:
         return jsonify({'error': 'No video file provided'}), 400
     
@@ -50,54 +81,309 @@ def process_video():
             'error': f'Invalid detector type. Available options: {list(DETECTORS.keys())}'
         }), 400
     
-    # Create detector
-    detector = DETECTORS[detector_type]()
-    detector.load()
+    store_embeddings = request.form.get('store_embeddings', 'false').lower() == 'true'
+    skip_duplicates = request.form.get('skip_duplicates', 'false').lower() == 'true'
+    
+    # Workers don't return embeddings, so there is nothing to store or compare
+    if DISTRIBUTED and (store_embeddings or skip_duplicates):
+        return jsonify({'error': 'store_embeddings and skip_duplicates are not supported in distributed mode'}), 400
+    
+    try:
+        threshold, classes = _parse_filter(request.form)
+        target_fps = _parse_analysis_fps(request.form, detector_type)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     video_file = request.files['video']
     
-    # Save uploaded video to a temp file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    # Save uploaded video to a temp file (on shared storage in distributed mode)
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4', dir=SHARED_DIR)
     video_file.save(temp_file.name)
     temp_file.close()
     
     try:
-        # Extract frames
-        video_data = extract_frames(temp_file.name)
-        
-        # Process each frame
-        frame_results = []
-        for i, frame in enumerate(video_data['frames']):
-            print(f'processing frame {i}/{video_data["frame_count"]}')
-            result = detector.detect(frame)
-            
-            # Add frame metadata
-            result['frame_number'] = i
-            result['timestamp'] = i / video_data['fps']
-            
-            frame_results.append(result)
+        # Cost the request from its metadata before decoding anything
+        video_info = probe_video(temp_file.name)
+        plan = GOVERNOR.plan(video_info, target_fps)
         
-        # Find segments with animals
-        segments = find_animal_segments(frame_results, video_data['fps'])
+        # Frames are decoded on the workers, one shard at a time
+        if DISTRIBUTED:
+            return jsonify(_run_distributed(temp_file.name, detector_type, video_info, plan,
+                                            threshold, classes))
         
-        # Prepare final result
-        result = {
-            'metadata': {
-                'fps': video_data['fps'],
-                'frame_count': video_data['frame_count'],
-                'duration': video_data['duration'],
-                'detector': detector.name
-            },
-            'frames': frame_results,
-            'animal_segments': segments
-        }
-        
-        return jsonify(result)
+        # Models are shared, so their memory is only reserved on first use
+        GOVERNOR.reserve_model(detector_type)
+        with GOVERNOR.admit(plan['estimated_bytes']):
+            return jsonify(_run_detection(temp_file.name, detector_type, plan,
+                                          store_embeddings, skip_duplicates,
+                                          threshold, classes))
+    
+    except RequestTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        # Unreadable upload (RequestTooLarge, also a ValueError, is caught above)
+        return jsonify({'error': str(e)}), 400
+    except AdmissionTimeout as e:
+        return jsonify({'error': str(e)}), 503
+    except ShardFailed as e:
+        return jsonify({'error': str(e)}), 502
         
     finally:
         # Clean up temp file
         os.unlink(temp_file.name)
 
+def _parse_filter(params):
+    """Read the optional threshold and comma-separated class filter"""
+    threshold = params.get('threshold')
+    if threshold is not None:
+        try:
+            if isinstance(threshold, bool):
+                raise ValueError
+            threshold = float(threshold)
+        except (TypeError, ValueError):
+            raise ValueError('threshold must be a number')
+        # NaN/inf would compare oddly and can't be echoed back as JSON
+        if not math.isfinite(threshold):
+            raise ValueError('threshold must be a finite number')
+    
+    classes = params.get('classes')
+    if isinstance(classes, str):
+        classes = [c.strip() for c in classes.split(',') if c.strip()]
+    elif classes is not None and (not isinstance(classes, list)
+                                  or not all(isinstance(c, str) for c in classes)):
+        raise ValueError('classes must be a comma-separated string or a list of strings')
+    
+    return threshold, classes or None
+
+def _parse_int(value, name, minimum=None):
+    """Read a whole-number parameter, optionally with a lower bound"""
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = int(value)
+        if number != float(value):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'{name} must be an integer')
+    
+    if minimum is not None and number < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    
+    return number
+
+def _parse_analysis_fps(params, detector_type):
+    """Read the optional analysis rate: a number, or 'native' for every frame"""
+    value = params.get('analysis_fps')
+    if value is None or value == '':
+        return analysis_fps(detector_type)
+    if str(value).lower() == 'native':
+        return None
+    
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("analysis_fps must be a number or 'native'")
+    if not math.isfinite(value):
+        raise ValueError("analysis_fps must be a finite number or 'native'")
+    if value <= 0:
+        raise ValueError('analysis_fps must be positive')
+    return value
+
+def _run_detection(video_path, detector_type, plan, store_embeddings, skip_duplicates,
+                   threshold=None, classes=None):
+    """Run a detector over an admitted video and build the response payload"""
+    # Shared detector plus a session holding this request's state
+    detector = get_detector(detector_type)
+    session = detector.create_session(return_embeddings=store_embeddings)
+    
+    video_id = video_fingerprint(video_path)
+    
+    # Embeddings from an earlier run of the same bytes tell us which frames are
+    # near-duplicates (a first run has none; see process_video)
+    duplicate_frames = set()
+    if skip_duplicates and EMBEDDINGS.has_video(video_id):
+        stored_frames, stored_embeddings = EMBEDDINGS.load(video_id)
+        mask = find_near_duplicates(stored_embeddings)
+        duplicate_frames = set(stored_frames[mask].tolist())
+    
+    # Extract frames within the admitted plan
+    video_data = extract_frames(
+        video_path,
+        skip_frames=plan['frame_stride'] - 1,
+        scale=plan['scale'],
+        max_frames=plan['max_frames'],
+        target_fps=plan['target_fps']
+    )
+    
+    # Run inference on each frame, keeping the raw candidates
+    candidates_seq = []
+    embedding_frames = []
+    embeddings = []
+    for frame, frame_number in zip(video_data['frames'], video_data['frame_numbers']):
+        if frame_number in duplicate_frames and candidates_seq:
+            # Reuse the previous candidates instead of running inference
+            candidates = dict(candidates_seq[-1])
+            candidates['duplicate'] = True
+        else:
+            print(f'processing frame {frame_number}/{video_data["frame_count"]}')
+            # Boxes are cached in original-frame pixels whatever the decode scale
+            candidates = unscale_candidates(detector.detect_raw(frame, session), plan['scale'])
+        
+        embedding = candidates.pop('embedding', None)
+        if embedding is not None:
+            embedding_frames.append(frame_number)
+            embeddings.append(embedding)
+        
+        candidates_seq.append(candidates)
+    
+    if store_embeddings and embeddings and not duplicate_frames:
+        EMBEDDINGS.add(video_id, embedding_frames, np.stack(embeddings))
+    
+    entry = {
+        'candidates': candidates_seq,
+        'frame_numbers': video_data['frame_numbers'],
+        'timestamps': video_data['timestamps'],
+        'metadata': {
+            'fps': video_data['fps'],
+            'frame_count': video_data['frame_count'],
+            'duration': video_data['duration'],
+            'detector': detector.name,
+            'video_id': video_id,
+            'scale': plan['scale'],
+            'frame_stride': plan['frame_stride'],
+            'analysis_fps': plan['target_fps'],
+            'frames_analyzed': len(candidates_seq),
+            'truncated': video_data['truncated']
+        }
+    }
+    CANDIDATES.put((video_id, detector_type), entry)
+    
+    return _segment(detector, entry, threshold, classes)
+
+def _run_distributed(video_path, detector_type, video_info, plan, threshold=None, classes=None):
+    """Shard a video across the worker pool and build the response payload"""
+    merged = COORDINATOR.run(video_path, detector_type, video_info, plan, threshold, classes,
+                             warmup_samples=warmup_samples(detector_type))
+    
+    # Cache the merged raw candidates, so /resegment works as in local mode
+    candidates_seq = []
+    frame_numbers = []
+    timestamps = []
+    for message in merged['candidates']:
+        candidates, frame_number, timestamp = decode_candidates(message)
+        candidates_seq.append(candidates)
+        frame_numbers.append(frame_number)
+        timestamps.append(timestamp)
+    
+    fps = video_info['fps']
+    video_id = video_fingerprint(video_path)
+    entry = {
+        'candidates': candidates_seq,
+        'frame_numbers': frame_numbers,
+        'timestamps': timestamps,
+        'metadata': {
+            'fps': fps,
+            'frame_count': video_info['frame_count'],
+            'duration': video_info['frame_count'] / fps if fps else 0,
+            'detector': detector_type,
+            'video_id': video_id,
+            'scale': plan['scale'],
+            'frame_stride': plan['frame_stride'],
+            'analysis_fps': plan['target_fps'],
+            'frames_analyzed': len(merged['frames']),
+            'truncated': merged['truncated'],
+            'shards': merged['shards']
+        }
+    }
+    CANDIDATES.put((video_id, detector_type), entry)
+    
+    # Workers already filtered the frames, so the front needs no model here
+    return {
+        'metadata': dict(entry['metadata'], threshold=threshold, classes=classes),
+        'frames': merged['frames'],
+        'animal_segments': merged['animal_segments']
+    }
+
+def _segment(detector, entry, threshold=None, classes=None):
+    """Filter cached candidates and find segments (no inference)"""
+    fps = entry['metadata']['fps']
+    frame_results = detector.postprocess(entry['candidates'], threshold, classes)
+    
+    for result, frame_number, timestamp in zip(frame_results, entry['frame_numbers'], entry['timestamps']):
+        # Add frame metadata (the original frame number and its presentation time)
+        result['frame_number'] = frame_number
+        result['timestamp'] = timestamp
+    
+    # Find segments with animals
+    segments = find_animal_segments(frame_results, fps)
+    
+    # Prepare final result
+    return {
+        'metadata': dict(entry['metadata'], threshold=threshold, classes=classes),
+        'frames': frame_results,
+        'animal_segments': segments
+    }
+
+@app.route('/resegment', methods=['POST'])
+def resegment():
+    """Re-filter an already-processed video at a new threshold without re-running inference"""
+    data = request.get_json(silent=True) or {}
+    video_id = data.get('video_id')
+    detector_type = data.get('detector', 'yolo')
+    
+    if video_id is None:
+        return jsonify({'error': 'video_id is required'}), 400
+    if detector_type not in DETECTORS:
+        return jsonify({
+            'error': f'Invalid detector type. Available options: {list(DETECTORS.keys())}'
+        }), 400
+    
+    try:
+        threshold, classes = _parse_filter(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    entry = CANDIDATES.get((video_id, detector_type))
+    if entry is None:
+        return jsonify({'error': 'Video has not been processed with this detector (or was evicted)'}), 404
+    
+    # In distributed mode this is the front's first use of the detector
+    try:
+        GOVERNOR.reserve_model(detector_type)
+    except (RequestTooLarge, AdmissionTimeout) as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify(_segment(get_detector(detector_type), entry, threshold, classes))
+
+@app.route('/similar-frames', methods=['POST'])
+def similar_frames():
+    """Find stored frames similar to a frame of an already-processed video"""
+    data = request.get_json(silent=True) or {}
+    video_id = data.get('video_id')
+    frame_number = data.get('frame_number')
+    
+    if video_id is None or frame_number is None:
+        return jsonify({'error': 'video_id and frame_number are required'}), 400
+    
+    try:
+        frame_number = _parse_int(frame_number, 'frame_number')
+        k = _parse_int(data.get('k', 10), 'k', minimum=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        query = EMBEDDINGS.get(video_id, frame_number)
+    except KeyError:
+        return jsonify({'error': 'No stored embedding for that frame'}), 404
+    
+    matches = EMBEDDINGS.search(
+        query, k=k,
+        exclude_video=None if data.get('include_same_video', False) else video_id,
+        projected=True
+    )
+    
+    return jsonify({'matches': matches})
+
 @app.route('/available-detectors', methods=['GET'])
 def available_detectors():
     """Get list of available detectors"""
@@ -113,4 +399,4 @@ def health():
 
 if __name__ == '__main__':
     # app.run(debug=True, host='0.0.0.0', port=5000)
-    app.run(port=5005)
+    app.run(port=5005, threaded=True)
@@ -0,0 +1,429 @@
+"""
+Per-frame embedding storage, near-duplicate detection and similarity search
+
+Maintenance (from backend/, while the server is stopped):
+    python -m utils.embedding_store info embeddings
+    python -m utils.embedding_store rebuild embeddings embeddings.new [--pca 128]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+def video_fingerprint(video_path, chunk_size=1 << 20):
+    """
+    Compute a content hash used as the video id in the embedding store
+
+    Args:
+        video_path: Path to video file
+        chunk_size: Bytes read per iteration
+
+    Returns:
+        str: Hex digest identifying the video contents
+    """
+    digest = hashlib.sha1()
+    with open(video_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_near_duplicates(embeddings, threshold=0.98):
+    """
+    Flag frames that are near-duplicates of the last kept frame
+
+    Comparing against the last kept frame (rather than just the previous
+    frame) stops a slow pan from being collapsed into a single frame.
+
+    Args:
+        embeddings: (N, D) array of L2-normalised embeddings in frame order
+        threshold: Cosine similarity above which a frame counts as a duplicate
+
+    Returns:
+        np.ndarray: Boolean mask of length N, True for duplicate frames
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    mask = np.zeros(len(embeddings), dtype=bool)
+    if len(embeddings) == 0:
+        return mask
+
+    anchor = embeddings[0]
+    for i in range(1, len(embeddings)):
+        if float(np.dot(anchor, embeddings[i])) >= threshold:
+            mask[i] = True
+        else:
+            anchor = embeddings[i]
+
+    return mask
+
+class EmbeddingStore:
+    """
+    Array-backed store of per-frame embeddings with similarity search
+
+    Vectors from every video are appended to a few large float16 shard
+    matrices (with a parallel array of video slot and frame number per
+    row), memory-mapped at search time. A query touches a handful of files
+    however many videos are stored, and the library can grow well past
+    available RAM. Replacing a video leaves its old rows behind as dead
+    rows until the store is rebuilt.
+
+    An optional PCA projection shrinks the stored vectors; it has to be
+    fitted before anything is added (see rebuild to apply one to an
+    existing store).
+    """
+
+    def __init__(self, root, shard_size=1 << 18):
+        self.root = root
+        self._lock = threading.Lock()
+        self._pca_mean = None
+        self._pca_components = None
+        self._maps = {}
+        self._alive = None
+
+        os.makedirs(self.root, exist_ok=True)
+        self._index = self._read_index(shard_size)
+
+        pca_path = os.path.join(self.root, 'pca.npz')
+        if os.path.exists(pca_path):
+            pca = np.load(pca_path)
+            self._pca_mean = pca['mean']
+            self._pca_components = pca['components']
+
+    @property
+    def dim(self):
+        """Dimension of the stored vectors (None until PCA is fitted or data is added)"""
+        if self._pca_components is not None:
+            return self._pca_components.shape[0]
+        return self._index.get('dim')
+
+    def stats(self):
+        """Summary of the store: videos, live and total rows, shards, dimension"""
+        with self._lock:
+            total = sum(self._index['shards'])
+            live = sum(sum(r[2] for r in v['ranges']) for v in self._index['videos'].values())
+            return {
+                'videos': len(self._index['videos']),
+                'rows': live,
+                'dead_rows': total - live,
+                'shards': len(self._index['shards']),
+                'dim': self.dim,
+                'pca': self._pca_components is not None
+            }
+
+    def fit_pca(self, samples, n_components=256):
+        """
+        Fit a PCA projection used for all subsequently stored embeddings
+
+        Args:
+            samples: (N, D) array of representative embeddings
+            n_components: Output dimension
+        """
+        with self._lock:
+            if self._index['videos']:
+                raise ValueError("PCA must be fitted before any embeddings are stored")
+
+            samples = np.asarray(samples, dtype=np.float32)
+            mean = samples.mean(axis=0)
+            _, _, vt = np.linalg.svd(samples - mean, full_matrices=False)
+
+            self._pca_mean = mean
+            self._pca_components = vt[:n_components].astype(np.float32)
+            np.savez(os.path.join(self.root, 'pca.npz'),
+                     mean=self._pca_mean, components=self._pca_components)
+
+    def has_video(self, video_id):
+        """Check whether embeddings for a video are stored"""
+        return video_id in self._index['videos']
+
+    def video_ids(self):
+        """Ids of all stored videos"""
+        return list(self._index['videos'])
+
+    def add(self, video_id, frame_numbers, embeddings):
+        """
+        Store embeddings for a video, replacing any previous entry
+
+        Args:
+            video_id: Video identifier (see video_fingerprint)
+            frame_numbers: Frame number for each embedding
+            embeddings: (N, D) array of embeddings
+        """
+        self._append(video_id, frame_numbers, self._project(embeddings))
+
+    def _append(self, video_id, frame_numbers, vectors):
+        """Append vectors that are already in the stored space (see add)"""
+        vectors = np.asarray(vectors).astype(np.float16)
+        frame_numbers = np.asarray(frame_numbers, dtype=np.int64)
+
+        if len(frame_numbers) != len(vectors):
+            raise ValueError("frame_numbers and embeddings must have the same length")
+
+        with self._lock:
+            if self._index.get('dim') not in (None, vectors.shape[1]):
+                raise ValueError(f"Expected {self._index['dim']}-d embeddings, got {vectors.shape[1]}-d")
+            self._index['dim'] = int(vectors.shape[1])
+
+            slot = self._index['next_slot']
+            ranges = []
+            written = 0
+            while written < len(vectors):
+                shard = self._writable_shard()
+                start = self._index['shards'][shard]
+                count = min(self._index['shard_size'] - start, len(vectors) - written)
+
+                shard_vectors, shard_refs = self._open_shard(shard)
+                shard_vectors[start:start + count] = vectors[written:written + count]
+                shard_refs[start:start + count, 0] = slot
+                shard_refs[start:start + count, 1] = frame_numbers[written:written + count]
+                shard_vectors.flush()
+                shard_refs.flush()
+
+                self._index['shards'][shard] += count
+                ranges.append([shard, start, count])
+                written += count
+
+            # Rows are on disk before the index points at them; any earlier
+            # entry's rows become dead
+            self._index['next_slot'] = slot + 1
+            self._index['videos'][video_id] = {'slot': slot, 'ranges': ranges}
+            self._alive = None
+            self._write_index()
+
+    def load(self, video_id):
+        """
+        Load the stored embeddings for a video
+
+        Returns:
+            tuple: (frame_numbers, embeddings) arrays
+        """
+        entry = self._index['videos'].get(video_id)
+        if entry is None:
+            raise KeyError(video_id)
+
+        frame_numbers = []
+        embeddings = []
+        for shard, start, count in entry['ranges']:
+            shard_vectors, shard_refs = self._open_shard(shard)
+            frame_numbers.append(np.array(shard_refs[start:start + count, 1]))
+            embeddings.append(np.array(shard_vectors[start:start + count]))
+
+        if not embeddings:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self._index['dim'] or 0), dtype=np.float16)
+        return np.concatenate(frame_numbers), np.concatenate(embeddings)
+
+    def get(self, video_id, frame_number):
+        """Return the stored vector for a single frame"""
+        frame_numbers, embeddings = self.load(video_id)
+        matches = np.nonzero(frame_numbers == frame_number)[0]
+        if len(matches) == 0:
+            raise KeyError(f"{video_id}:{frame_number}")
+        return np.asarray(embeddings[matches[0]], dtype=np.float32)
+
+    def search(self, query, k=10, exclude_video=None, chunk_size=65536, projected=False):
+        """
+        Find the stored frames most similar to a query embedding
+
+        Shards are scanned in fixed-size chunks with a running top-k, so
+        memory use stays flat regardless of library size.
+
+        Args:
+            query: Query embedding (raw, or already projected if projected=True)
+            k: Number of results
+            exclude_video: Optional video id to leave out of the results
+            chunk_size: Number of vectors scored per matrix product
+            projected: Whether the query is already in the stored space
+
+        Returns:
+            list: Matches sorted by score with keys video_id, frame_number, score
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if not projected:
+            query = self._project(query[None, :])[0]
+
+        # Snapshot under the lock; rows past these counts may be mid-write
+        with self._lock:
+            counts = list(self._index['shards'])
+            alive = self._alive_mask()
+            slot_ids = {v['slot']: video_id for video_id, v in self._index['videos'].items()}
+            excluded = self._index['videos'].get(exclude_video, {}).get('slot')
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_refs = np.empty((0, 2), dtype=np.int64)
+
+        for shard, count in enumerate(counts):
+            shard_vectors, shard_refs = self._open_shard(shard)
+
+            for start in range(0, count, chunk_size):
+                end = min(start + chunk_size, count)
+                scores = np.asarray(shard_vectors[start:end], dtype=np.float32) @ query
+                refs = np.asarray(shard_refs[start:end])
+
+                # Drop replaced videos' rows and the excluded video
+                keep = alive[refs[:, 0]]
+                if excluded is not None:
+                    keep &= refs[:, 0] != excluded
+                scores = scores[keep]
+                refs = refs[keep]
+
+                # Keep only this chunk's top-k before merging
+                if len(scores) > k:
+                    top = np.argpartition(-scores, k)[:k]
+                    scores, refs = scores[top], refs[top]
+
+                best_scores = np.concatenate([best_scores, scores])
+                best_refs = np.concatenate([best_refs, refs])
+
+                if len(best_scores) > k:
+                    top = np.argpartition(-best_scores, k)[:k]
+                    best_scores, best_refs = best_scores[top], best_refs[top]
+
+        order = np.argsort(-best_scores)
+        return [
+            {
+                'video_id': slot_ids[int(best_refs[j, 0])],
+                'frame_number': int(best_refs[j, 1]),
+                'score': float(best_scores[j])
+            }
+            for j in order
+        ]
+
+    def _project(self, embeddings):
+        """Apply the PCA projection (if any) and re-normalise"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self._pca_components is None:
+            return vectors
+
+        vectors = (vectors - self._pca_mean) @ self._pca_components.T
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _alive_mask(self):
+        """Boolean mask over video slots, True for slots still in the index"""
+        if self._alive is None:
+            alive = np.zeros(self._index['next_slot'], dtype=bool)
+            alive[[v['slot'] for v in self._index['videos'].values()]] = True
+            self._alive = alive
+        return self._alive
+
+    def _writable_shard(self):
+        """Index of the shard to append to, starting a new one when full"""
+        shards = self._index['shards']
+        if not shards or shards[-1] >= self._index['shard_size']:
+            shards.append(0)
+        return len(shards) - 1
+
+    def _open_shard(self, shard):
+        """Memory-map a shard's vector and reference arrays (created on first use)"""
+        if shard not in self._maps:
+            vectors_path, refs_path = self._shard_paths(shard)
+            mode = 'r+' if os.path.exists(vectors_path) else 'w+'
+            size = self._index['shard_size']
+            self._maps[shard] = (
+                np.memmap(vectors_path, dtype=np.float16, mode=mode, shape=(size, self._index['dim'])),
+                np.memmap(refs_path, dtype=np.int64, mode=mode, shape=(size, 2))
+            )
+        return self._maps[shard]
+
+    def _shard_paths(self, shard):
+        return (os.path.join(self.root, f"vectors_{shard:04d}.f16"),
+                os.path.join(self.root, f"refs_{shard:04d}.i64"))
+
+    def _read_index(self, shard_size):
+        index_path = os.path.join(self.root, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                return json.load(f)
+        return {'dim': None, 'shard_size': shard_size, 'shards': [], 'next_slot': 0, 'videos': {}}
+
+    def _write_index(self):
+        index_path = os.path.join(self.root, 'index.json')
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            # dumps uses the C encoder; dump streams through the pure-Python one
+            f.write(json.dumps(self._index))
+        os.replace(tmp_path, index_path)
+
+def rebuild(root, target_root, n_components=None, sample_size=20000, seed=0):
+    """
+    Copy a store's live rows into a new store, optionally fitting PCA
+
+    Drops the dead rows left by replaced videos. With n_components, a PCA
+    projection is fitted on a sample of the stored vectors and applied to
+    everything copied.
+
+    Args:
+        root: Existing store directory
+        target_root: Directory for the new store (must be empty or missing)
+        n_components: PCA output dimension (None = keep vectors as they are)
+        sample_size: Number of stored vectors to fit PCA on
+        seed: Seed for picking the PCA sample
+
+    Returns:
+        EmbeddingStore: The new store
+    """
+    source = EmbeddingStore(root)
+    if os.path.isdir(target_root) and os.listdir(target_root):
+        raise ValueError(f"Target directory is not empty: {target_root}")
+    target = EmbeddingStore(target_root, shard_size=source._index['shard_size'])
+
+    if n_components is not None:
+        if source._pca_components is not None:
+            raise ValueError("Store is already PCA-projected")
+        video_ids = source.video_ids()
+        rng = np.random.default_rng(seed)
+        samples = []
+        for video_id in rng.permutation(len(video_ids)):
+            samples.append(np.asarray(source.load(video_ids[video_id])[1], dtype=np.float32))
+            if sum(len(s) for s in samples) >= sample_size:
+                break
+        if samples:
+            samples = np.concatenate(samples)
+            samples = samples[rng.permutation(len(samples))[:sample_size]]
+            target.fit_pca(samples, n_components)
+    elif source._pca_components is not None:
+        target._pca_mean = source._pca_mean
+        target._pca_components = source._pca_components
+        np.savez(os.path.join(target_root, 'pca.npz'),
+                 mean=source._pca_mean, components=source._pca_components)
+
+    for video_id in source.video_ids():
+        frame_numbers, embeddings = source.load(video_id)
+        if n_components is not None:
+            target.add(video_id, frame_numbers, embeddings)
+        else:
+            # Already in the stored space; don't project twice
+            target._append(video_id, frame_numbers, embeddings)
+
+    return target
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    info_parser = subparsers.add_parser('info', help='Show store statistics')
+    info_parser.add_argument('root')
+
+    rebuild_parser = subparsers.add_parser('rebuild', help='Compact a store, optionally fitting PCA')
+    rebuild_parser.add_argument('root')
+    rebuild_parser.add_argument('target', help='Directory for the rebuilt store')
+    rebuild_parser.add_argument('--pca', type=int, dest='n_components', help='Project to this many dimensions')
+    rebuild_parser.add_argument('--sample', type=int, default=20000, help='Vectors to fit PCA on')
+
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        print(json.dumps(EmbeddingStore(args.root).stats(), indent=2))
+        return
+
+    target = rebuild(args.root, args.target, args.n_components, args.sample)
+    print(json.dumps(target.stats(), indent=2))
+    print(f"Rebuilt store in {args.target}; point FUZZYFINDER_EMBEDDINGS_DIR at it (or swap the "
+          f"directories) while the server is stopped")
+
+if __name__ == '__main__':
+    main()
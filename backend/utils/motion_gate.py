@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+
+# Frames of history MOG2 learns the background from
+DEFAULT_HISTORY = 500
+
+class MotionGate:
+    """
+    Background-subtraction front end that finds moving regions in a frame
+
+    Uses OpenCV's MOG2 model, so it is meant for fixed-camera footage: the
+    static background is learned over the first frames and only regions
+    that change are reported.
+    """
+
+    def __init__(self, history=DEFAULT_HISTORY, var_threshold=16, min_area=64, padding=0.5,
+                 min_crop_size=224, max_regions=8):
+        self.history = history
+        self.var_threshold = var_threshold
+        self.min_area = min_area
+        self.padding = padding
+        self.min_crop_size = min_crop_size
+        self.max_regions = max_regions
+        self.subtractor = None
+        self.frames_seen = 0
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        self.reset()
+
+    def reset(self):
+        """Forget the learned background (e.g. when a new video starts)"""
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(
+            history=self.history,
+            varThreshold=self.var_threshold,
+            detectShadows=True
+        )
+        self.frames_seen = 0
+
+    def regions(self, frame):
+        """
+        Update the background model and return padded motion regions
+
+        Args:
+            frame: CV2 image (BGR format)
+
+        Returns:
+            list: Regions as [x1, y1, x2, y2] in frame coordinates, largest first
+        """
+        mask = self.subtractor.apply(frame)
+        self.frames_seen += 1
+
+        # MOG2 marks shadows as 127; keep only confident foreground
+        _, mask = cv2.threshold(mask, 200, 255, cv2.THRESH_BINARY)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+        mask = cv2.dilate(mask, self.kernel, iterations=2)
+
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        height, width = frame.shape[:2]
+        boxes = []
+        for contour in contours:
+            if cv2.contourArea(contour) < self.min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append(self._pad_box([x, y, x + w, y + h], width, height))
+
+        boxes = merge_boxes(boxes)
+        boxes.sort(key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)
+        return boxes[:self.max_regions]
+
+    def _pad_box(self, box, width, height):
+        """Grow a box by the padding fraction and up to the minimum crop size"""
+        x1, y1, x2, y2 = box
+        pad_w = max((x2 - x1) * (1 + self.padding), self.min_crop_size)
+        pad_h = max((y2 - y1) * (1 + self.padding), self.min_crop_size)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+
+        x1 = int(max(0, cx - pad_w / 2))
+        y1 = int(max(0, cy - pad_h / 2))
+        x2 = int(min(width, cx + pad_w / 2))
+        y2 = int(min(height, cy + pad_h / 2))
+        return [x1, y1, x2, y2]
+
+def merge_boxes(boxes):
+    """
+    Merge overlapping boxes until none overlap
+
+    Args:
+        boxes: List of [x1, y1, x2, y2] boxes
+
+    Returns:
+        list: Non-overlapping boxes covering the same area
+    """
+    boxes = [list(box) for box in boxes]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+def crop_regions(frame, regions):
+    """Cut the given regions out of a frame (views, no copy)"""
+    return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+
+def offset_boxes(boxes, count, region):
+    """
+    Map boxes found on a crop back to full-frame coordinates
+
+    Classifiers that don't produce boxes get the crop region as their box.
+
+    Args:
+        boxes: (N, 4) array of crop-relative boxes, or None
+        count: Number of candidates the boxes belong to
+        region: The crop's [x1, y1, x2, y2] in the full frame
+
+    Returns:
+        np.ndarray: (N, 4) float32 boxes in full-frame coordinates
+    """
+    if boxes is None:
+        return np.tile(np.asarray(region, dtype=np.float32), (count, 1))
+    offset = np.array([region[0], region[1], region[0], region[1]], dtype=np.float32)
+    return boxes + offset
@@ -0,0 +1,199 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+import cv2
+
+class RequestTooLarge(ValueError):
+    """Raised when a request cannot fit the memory budget even after degrading"""
+    pass
+
+class AdmissionTimeout(RuntimeError):
+    """Raised when a request waited too long for memory to become available"""
+    pass
+
+def probe_video(video_path):
+    """
+    Read video metadata without decoding any frames
+
+    Args:
+        video_path: Path to video file
+
+    Returns:
+        dict: Video info with keys width, height, frame_count, fps
+    """
+    cap = cv2.VideoCapture(video_path)
+
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+
+    info = {
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        'fps': cap.get(cv2.CAP_PROP_FPS)
+    }
+    cap.release()
+
+    return info
+
+def estimate_frame_bytes(video_info, scale=1.0, frame_stride=1):
+    """
+    Estimate the memory needed to hold the decoded frames of a video
+
+    Args:
+        video_info: Metadata from probe_video
+        scale: Resize factor applied at decode time
+        frame_stride: Keep every Nth frame
+
+    Returns:
+        int: Estimated bytes for the BGR frame buffer
+    """
+    width = max(1, int(video_info['width'] * scale))
+    height = max(1, int(video_info['height'] * scale))
+    frames = math.ceil(max(video_info['frame_count'], 0) / frame_stride)
+    return width * height * 3 * frames
+
+class ResourceGovernor:
+    """
+    Admission control for video processing requests
+
+    Each request is costed from its video metadata, degraded (downscaled,
+    then frame-sampled) until it fits the per-request limit, and then
+    admitted against a shared memory budget. Requests that don't fit yet
+    wait in line; requests that can never fit are rejected.
+
+    Loaded models are shared by all requests, so their memory is reserved
+    once per detector type (see reserve_model) rather than per request.
+    """
+
+    def __init__(self, memory_budget, per_request_limit=None, model_overhead=512 * 1024 ** 2,
+                 max_frames=20000, min_width=640, max_frame_stride=30, queue_timeout=60.0):
+        self.memory_budget = memory_budget
+        self.per_request_limit = per_request_limit or memory_budget
+        self.model_overhead = model_overhead
+        self.max_frames = max_frames
+        self.min_width = min_width
+        self.max_frame_stride = max_frame_stride
+        self.queue_timeout = queue_timeout
+
+        self._in_use = 0
+        self._models = set()
+        self._condition = threading.Condition()
+
+    @property
+    def in_use(self):
+        """Bytes currently reserved by admitted requests"""
+        return self._in_use
+
+    def plan(self, video_info, target_fps=None):
+        """
+        Choose decode settings that keep a request within its limits
+
+        Args:
+            video_info: Metadata from probe_video
+            target_fps: Requested analysis rate (None = every frame)
+
+        Returns:
+            dict: Plan with keys scale, frame_stride, target_fps, max_frames,
+                estimated_bytes. When target_fps is set the stride is folded
+                into it (sampling by time) and frame_stride is 1.
+        """
+        frame_budget = self.per_request_limit
+
+        # Containers that don't report a frame count are costed at the frame cap
+        info = dict(video_info)
+        if info['frame_count'] <= 0:
+            info['frame_count'] = self.max_frames
+
+        # Only the sampled frames are decoded, so cost those
+        if target_fps is not None and (info['fps'] <= 0 or target_fps >= info['fps']):
+            target_fps = None
+        if target_fps is not None:
+            info['frame_count'] = math.ceil(info['frame_count'] * target_fps / info['fps'])
+
+        scale = 1.0
+        frame_stride = max(1, math.ceil(info['frame_count'] / self.max_frames))
+
+        # Detectors resize to a few hundred pixels anyway, so downscale first
+        if estimate_frame_bytes(info, scale, frame_stride) > frame_budget and info['width'] > self.min_width:
+            needed = math.sqrt(frame_budget / estimate_frame_bytes(info, 1.0, frame_stride))
+            scale = max(needed, self.min_width / info['width'])
+
+        # Then fall back to sampling frames
+        while estimate_frame_bytes(info, scale, frame_stride) > frame_budget:
+            if frame_stride >= self.max_frame_stride:
+                raise RequestTooLarge(
+                    f"Video needs {estimate_frame_bytes(info, scale, frame_stride)} bytes "
+                    f"after degrading; per-request frame budget is {frame_budget}"
+                )
+            frame_stride += 1
+
+        # Sampling by time replaces the stride: every Nth sample is a lower rate
+        if target_fps is not None:
+            target_fps /= frame_stride
+            info['frame_count'] = math.ceil(info['frame_count'] / frame_stride)
+            frame_stride = 1
+
+        # Container frame counts are approximate, so leave a little headroom
+        return {
+            'scale': scale,
+            'frame_stride': frame_stride,
+            'target_fps': target_fps,
+            'max_frames': math.ceil(info['frame_count'] / frame_stride * 1.05) + 1,
+            'estimated_bytes': estimate_frame_bytes(info, scale, frame_stride)
+        }
+
+    @contextmanager
+    def admit(self, estimated_bytes, timeout=None):
+        """
+        Reserve memory for the duration of a request, waiting if necessary
+
+        Args:
+            estimated_bytes: Reservation size (see plan)
+            timeout: Seconds to wait before giving up (defaults to queue_timeout)
+        """
+        with self._condition:
+            available = self.memory_budget - len(self._models) * self.model_overhead
+            if estimated_bytes > available:
+                raise RequestTooLarge(f"Request needs {estimated_bytes} bytes; "
+                                      f"budget left after loaded models is {available}")
+            self._wait_for(estimated_bytes, timeout)
+            self._in_use += estimated_bytes
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_use -= estimated_bytes
+                self._condition.notify_all()
+
+    def reserve_model(self, detector_type, timeout=None):
+        """
+        Reserve model_overhead for a detector type, once for the process lifetime
+
+        Call before a request that may load the detector; later calls for
+        the same type return immediately.
+
+        Args:
+            detector_type: Registry key of the detector
+            timeout: Seconds to wait for room (defaults to queue_timeout)
+        """
+        with self._condition:
+            if detector_type in self._models:
+                return
+            if self.model_overhead > self.memory_budget - len(self._models) * self.model_overhead:
+                raise RequestTooLarge(f"No room left in the memory budget to load {detector_type}")
+            self._wait_for(self.model_overhead, timeout)
+            self._in_use += self.model_overhead
+            self._models.add(detector_type)
+
+    def _wait_for(self, needed_bytes, timeout):
+        """Wait (holding the condition) until needed_bytes fit in the budget"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while self._in_use + needed_bytes > self.memory_budget:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise AdmissionTimeout("Timed out waiting for memory to become available")
+            self._condition.wait(remaining)
@@ -0,0 +1,32 @@
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of per-video raw detection candidates
+
+    Entries hold the compact candidate arrays for every analysed frame, so
+    a video can be re-filtered at a new threshold without re-running
+    inference.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        """Store an entry, evicting the least recently used if full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return an entry (marking it recently used), or None if absent"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
@@ -3,20 +3,36 @@ import os
 import numpy as np
 import tempfile
 
-def extract_frames(video_path, skip_frames=0):
+def extract_frames(video_path, skip_frames=0, scale=1.0, max_frames=None,
+                   start_frame=0, end_frame=None, target_fps=None):
     """
     Extract frames from video
     
+    Frames that aren't kept are grabbed but not retrieved. The codec still
+    decodes every frame (inter-frame video can't be decoded out of order
+    cheaply), so sampling only saves the per-frame colour conversion,
+    resize and copy; its main saving is inference cost.
+    
     Args:
         video_path: Path to video file
         skip_frames: Process every Nth frame (0 = process all)
+        scale: Resize factor applied to each kept frame
+        max_frames: Maximum number of frames to buffer (None = unlimited);
+            decoding stops there and the result is marked truncated
+        start_frame: First frame to read (seeks past earlier frames)
+        end_frame: Stop before this frame (None = read to the end)
+        target_fps: Sample at most this many frames per second of video
+            time, using the frames' timestamps (None = every frame)
         
     Returns:
         dict: Video info with keys:
             - frames: List of frames
+            - frame_numbers: Original frame index of each kept frame
+            - timestamps: Presentation time of each kept frame in seconds
             - fps: Frames per second
             - frame_count: Total frame count
             - duration: Video duration in seconds
+            - truncated: Whether decoding stopped early at max_frames
     """
     cap = cv2.VideoCapture(video_path)
     
@@ -28,36 +44,105 @@ def extract_frames(video_path, skip_frames=0):
     duration = frame_count / fps
     
     frames = []
+    frame_numbers = []
+    timestamps = []
     frame_idx = 0
+    prev_slot = None
+    truncated = False
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
+    if start_frame > 0:
+        frame_idx = start_frame
+        if target_fps:
+            # Grab the frame before the start to know which slot it was in,
+            # so a seek keeps exactly the frames a full pass would
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame - 1)
+            if cap.grab():
+                prev_slot = frame_slot(frame_timestamp(cap, start_frame - 1, fps), target_fps)
+        else:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    
+    while end_frame is None or frame_idx < end_frame:
+        if not cap.grab():
             break
+        
+        timestamp = frame_timestamp(cap, frame_idx, fps)
+        
+        # Keep only the first frame of each 1/target_fps slot of video time
+        if target_fps:
+            slot = frame_slot(timestamp, target_fps)
+            is_new_slot = slot != prev_slot
+            prev_slot = slot
+            if not is_new_slot:
+                frame_idx += 1
+                continue
             
         # Skip frames if requested
         if skip_frames > 0 and frame_idx % (skip_frames + 1) != 0:
             frame_idx += 1
             continue
+        
+        # Enforce the per-request frame buffer limit. Container frame counts
+        # can be low (VFR, streamed files), so keep what fits rather than fail
+        if max_frames is not None and len(frames) >= max_frames:
+            print(f"Frame buffer limit of {max_frames} frames reached; truncating {video_path}")
+            truncated = True
+            break
+        
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        
+        if scale != 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
             
         frames.append(frame)
+        frame_numbers.append(frame_idx)
+        timestamps.append(timestamp)
         frame_idx += 1
     
     cap.release()
     
     return {
         'frames': frames,
+        'frame_numbers': frame_numbers,
+        'timestamps': timestamps,
         'fps': fps,
         'frame_count': frame_count,
-        'duration': duration
+        'duration': duration,
+        'truncated': truncated
     }
 
+def frame_slot(timestamp, target_fps):
+    """Index of the 1/target_fps interval (counted from t=0) a timestamp falls in"""
+    return int(timestamp * target_fps + 1e-6)
+
+def frame_timestamp(cap, frame_idx, fps):
+    """
+    Presentation time of the frame just grabbed, in seconds
+    
+    Uses the container's timestamps, which stay correct for variable frame
+    rate video; falls back to frame_idx / fps for backends that don't
+    report them.
+    """
+    msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+    if msec > 0 or frame_idx == 0:
+        return msec / 1000.0
+    return frame_idx / fps if fps else 0.0
+
 def find_animal_segments(frame_results, fps):
     """
     Find segments of video that contain animals
     
+    When frames were sampled, each analysed frame stands for the original
+    frames up to the next analysed one, so a segment runs until just
+    before the first analysed frame without animals (or, at the end of the
+    video, for one more sample period).
+    
     Args:
-        frame_results: List of detection results per frame
+        frame_results: List of detection results per frame (results carrying
+            a 'frame_number' key are placed by that number, so sampled
+            frames map back to the original video; a 'timestamp' key
+            overrides the frame_number / fps time)
         fps: Frames per second of the video
         
     Returns:
@@ -71,33 +156,58 @@ def find_animal_segments(frame_results, fps):
     segments = []
     in_segment = False
     start_frame = 0
+    start_time = 0.0
     
+    # Frame numbers and times are only looked up at segment boundaries
     for i, result in enumerate(frame_results):
         has_animal = result.get('has_animals', False)
         
         if has_animal and not in_segment:
             # Start of a new segment
             in_segment = True
-            start_frame = i
+            start_frame = result.get('frame_number', i)
+            start_time = _result_time(result, start_frame, fps)
         elif not has_animal and in_segment:
-            # End of a segment
+            # End of a segment, just before this frame
             in_segment = False
+            frame_number = result.get('frame_number', i)
+            last_result = frame_results[i - 1]
+            last_frame = last_result.get('frame_number', i - 1)
+            end_time = max(_result_time(last_result, last_frame, fps),
+                           _result_time(result, frame_number, fps) - 1 / fps)
             segments.append({
                 'start_frame': start_frame,
-                'end_frame': i - 1,
-                'start_time': start_frame / fps,
-                'end_time': (i - 1) / fps,
-                'duration': (i - 1 - start_frame) / fps
+                'end_frame': max(last_frame, frame_number - 1),
+                'start_time': start_time,
+                'end_time': end_time,
+                'duration': end_time - start_time
             })
     
     # Check if we ended while still in a segment
     if in_segment:
+        last_result = frame_results[-1]
+        last_frame = last_result.get('frame_number', len(frame_results) - 1)
+        end_frame = last_frame
+        end_time = _result_time(last_result, last_frame, fps)
+        
+        # Extend by the spacing between the last two analysed frames
+        if len(frame_results) > 1:
+            prev_result = frame_results[-2]
+            prev_frame = prev_result.get('frame_number', len(frame_results) - 2)
+            end_frame = last_frame + max(last_frame - prev_frame - 1, 0)
+            end_time = max(end_time, 2 * end_time - _result_time(prev_result, prev_frame, fps) - 1 / fps)
+        
         segments.append({
             'start_frame': start_frame,
-            'end_frame': len(frame_results) - 1,
-            'start_time': start_frame / fps,
-            'end_time': (len(frame_results) - 1) / fps,
-            'duration': (len(frame_results) - 1 - start_frame) / fps
+            'end_frame': end_frame,
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration': end_time - start_time
         })
     
     return segments
+
+def _result_time(result, frame_number, fps):
+    """A frame result's timestamp, or frame_number / fps if it has none"""
+    timestamp = result.get('timestamp')
+    return frame_number / fps if timestamp is None else timestamp